@@ -0,0 +1,3 @@
+# Submodules are imported on demand so that importing the package stays
+# cheap, e.g. from aws_audit.aws_auditing_list import AWSAudit
+__version__ = '0.0.1'
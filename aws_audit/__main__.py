@@ -0,0 +1,3 @@
+from aws_audit.aws_auditing_list import main
+
+main()
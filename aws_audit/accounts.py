@@ -0,0 +1,364 @@
+import math
+import sys
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    as_completed
+)
+
+from aws_audit.aws_auditing_list import AWSAudit
+from aws_audit.connection import (
+    ClientRegistry,
+    registry
+)
+from aws_audit.constants import aws_region
+from aws_audit.cost import CostEngine
+from aws_audit.profiling import (
+    NULL_PROFILER,
+    ProfileOutput,
+    Profiler
+)
+from aws_audit.report import (
+    REPORT_WRITERS,
+    ReportRow,
+    change_rows,
+    cost_rows
+)
+
+# Multi-account audits. With --pricing, prices are loaded once in the
+# parent process and handed to every worker process through the pool
+# initializer; each worker then audits whole accounts, assuming the
+# account's role into a ClientRegistry of its own, and sends back only
+# the report rows (--resources) and costed usage (--pricing) of each
+# region, which are merged here into one report per kind. With --profile each worker
+# also sends back the profile of its account, added to the parent's.
+
+ROLE_SESSION_NAME = 'aws-audit'
+
+
+class AccountTarget:
+    __slots__ = ('account_id', 'role_arn')
+
+    def __init__(self, account_id, role_arn):
+        self.account_id = account_id
+        self.role_arn = role_arn
+
+
+class AccountResult:
+    __slots__ = ('account_id', 'regions', 'resources', 'changes', 'error', 'profile')
+
+    def __init__(
+        self,
+        account_id,
+        regions,
+        resources=None,
+        changes=None,
+        error=None,
+        profile=None
+    ):
+        self.account_id = account_id
+        # {region: {service: ServiceCost}}, see AWSAudit.region_costs,
+        # empty without --pricing
+        self.regions = regions
+        # {region: [ReportRow]}, see AWSAudit.resource_rows, empty without
+        # --resources
+        self.resources = resources if resources is not None else {}
+        # {region: changes}, see RegionState.changes, with --incremental
+        # for the regions audited before
+        self.changes = changes if changes is not None else {}
+        self.error = error
+        # Profiler.summary() of the account's audit, with --profile
+        self.profile = profile
+
+    @property
+    def total_cost(self):
+        return math.fsum(
+            cost.total_cost
+            for costs in self.regions.values()
+            for cost in costs.values()
+        )
+
+
+# Accounts listed in a file, one account id or role ARN per line. Role
+# role_name is assumed in accounts given by id; blank lines and lines
+# starting with '#' are skipped.
+def read_accounts(path, role_name):
+    targets = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('arn:'):
+                targets.append(AccountTarget(line.split(':')[4], line))
+            else:
+                targets.append(AccountTarget(
+                    line,
+                    'arn:aws:iam::{}:role/{}'.format(line, role_name)
+                ))
+    return targets
+
+
+# State of a worker process, set once by init_worker
+worker = {}
+
+
+def init_worker(args, price_index):
+    worker['args'] = args
+    worker['price_index'] = price_index
+
+
+# Audit one account in a worker process. Errors are returned rather than
+# raised so one inaccessible account doesn't fail the others.
+def audit_account(target):
+    args = worker['args']
+    audit = None
+    try:
+        clients = ClientRegistry().assume_role(target.role_arn, ROLE_SESSION_NAME)
+        audit = AWSAudit(args, clients=clients)
+        audit.profiler.attach(clients)
+        audit.prepare()
+        audit.discover_resources(audit.aws_regions, args.workers)
+        changes = {}
+        if audit.state_store is not None:
+            for region in audit.aws_regions:
+                region_changes = audit.update_state(region)
+                if region_changes is not None:
+                    changes[region] = region_changes
+        resources = {}
+        if args.resources:
+            resources = {region: audit.resource_rows(region) for region in audit.aws_regions}
+        costs = {}
+        if args.pricing:
+            engine = CostEngine(worker['price_index'], audit.per_month_hours)
+            costs = {
+                region: audit.region_costs(region, engine)
+                for region in audit.aws_regions
+            }
+        result = AccountResult(target.account_id, costs, resources, changes)
+    except Exception as e:
+        result = AccountResult(
+            target.account_id,
+            {},
+            error='{}: {}'.format(type(e).__name__, e)
+        )
+    if audit is not None:
+        audit.profiler.detach()
+        if args.profile:
+            result.profile = audit.profiler.summary()
+    return result
+
+
+class MultiAccountAudit:
+    def __init__(self, args, targets, clients=registry):
+        self.args = args
+        self.targets = targets
+        self.clients = clients
+        self.profiler = Profiler() if args.profile else NULL_PROFILER
+        self.results = []
+
+    # Prices of the audited regions, loaded once for every account, only
+    # with --pricing
+    def price_index(self):
+        if not self.args.pricing:
+            return None
+        if self.args.region:
+            regions = [self.args.region]
+        else:
+            regions = aws_region
+        audit = AWSAudit(self.args, clients=self.clients, profiler=self.profiler)
+        audit.configure_clients()
+        return audit.price_engine(regions).price_index
+
+    # With --output-format ndjson or csv each account's rows are written as
+    # soon as its worker is done, otherwise one table is printed at the end.
+    # With --profile the profile of every account is written with that of
+    # the price loading once the audit is done or has failed.
+    def run(self):
+        profile = None
+        if self.args.profile:
+            profile = ProfileOutput(self.profiler, self.args.profile)
+        self.profiler.attach(self.clients)
+        try:
+            self.audit_accounts()
+        finally:
+            self.profiler.detach()
+            if profile is not None:
+                profile.close()
+        return self
+
+    def audit_accounts(self):
+        price_index = self.price_index()
+        output = sys.stdout
+        if self.args.output:
+            output = open(self.args.output, 'w', newline='')
+        writer = None
+        if self.args.output_format != 'table':
+            writer = REPORT_WRITERS[self.args.output_format](output)
+
+        try:
+            results = {}
+            with ProcessPoolExecutor(
+                max_workers=max(1, min(self.args.account_workers, len(self.targets))),
+                initializer=init_worker,
+                initargs=(self.args, price_index)
+            ) as executor:
+                futures = [executor.submit(audit_account, target) for target in self.targets]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results[result.account_id] = result
+                    if result.profile is not None:
+                        self.profiler.add_summary(result.profile, account=result.account_id)
+                    if writer is not None:
+                        self.write_result(writer, result)
+
+            self.results = [results[target.account_id] for target in self.targets]
+            if writer is None:
+                for table in self.reports():
+                    print(table, file=output)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+    def write_result(self, writer, result):
+        if result.error is not None:
+            writer.write_region([
+                ReportRow(result.account_id, '', 'error', 'account', detail=result.error)
+            ])
+            return
+        for region, changes in result.changes.items():
+            writer.write_region(change_rows(result.account_id, region, changes))
+        for region in self.result_regions(result):
+            rows = list(result.resources.get(region, []))
+            if region in result.regions:
+                rows.extend(cost_rows(result.account_id, region, result.regions[region]))
+            writer.write_region(rows)
+
+    # Regions of an account's resources and pricing rows, in audit order
+    def result_regions(self, result):
+        return list(dict.fromkeys(list(result.resources) + list(result.regions)))
+
+    # Tables of the requested reports, in the order of a single-account
+    # audit. Failed accounts are listed in the resources and pricing
+    # tables with their error, or in a table of their own when neither
+    # was requested.
+    def reports(self):
+        tables = []
+        if any(result.changes for result in self.results):
+            tables.append(self.changes_report())
+        if self.args.resources:
+            tables.append(self.resources_report())
+        if self.args.pricing:
+            tables.append(self.pricing_report())
+        if (
+            not (self.args.resources or self.args.pricing)
+            and any(result.error is not None for result in self.results)
+        ):
+            tables.append(self.errors_report())
+        return tables
+
+    # Consolidated resource counts, one section per account and region
+    def resources_report(self):
+        from prettytable import PrettyTable
+
+        table = PrettyTable()
+        table.field_names = [
+            'Account',
+            'Region',
+            'Service',
+            'Type',
+            'Count',
+            'Total Instances/Size',
+        ]
+        table.align = 'l'
+
+        for result in self.results:
+            table.add_row([result.account_id, '', '', '', '', ''])
+            if result.error is not None:
+                table.add_row(['', '', 'error', result.error, '', ''])
+                continue
+            for region, rows in result.resources.items():
+                table.add_row(['', region, '', '', '', ''])
+                for row in rows:
+                    table.add_row(['', '', row.service, row.type, row.count, row.quantity])
+        return table
+
+    # What changed since the previous --incremental run, by account and
+    # region
+    def changes_report(self):
+        from prettytable import PrettyTable
+
+        table = PrettyTable()
+        table.field_names = ['Account', 'Region', 'Service', 'Resource', 'Change', 'Detail']
+        table.align = 'l'
+
+        for result in self.results:
+            if not result.changes:
+                continue
+            table.add_row([result.account_id, '', '', '', '', ''])
+            for region, changes in result.changes.items():
+                table.add_row(['', region, '', '', '', ''])
+                if not changes:
+                    table.add_row(['', '', '', '', 'no changes', ''])
+                for service, resource, change, detail in changes:
+                    table.add_row(['', '', service, resource, change, detail])
+        return table
+
+    def errors_report(self):
+        from prettytable import PrettyTable
+
+        table = PrettyTable()
+        table.field_names = ['Account', 'Error']
+        table.align = 'l'
+        for result in self.results:
+            if result.error is not None:
+                table.add_row([result.account_id, result.error])
+        return table
+
+    # Consolidated pricing report, one section per account and region
+    def pricing_report(self):
+        from prettytable import PrettyTable
+
+        table = PrettyTable()
+        table.field_names = [
+            'Account',
+            'Region',
+            'Service',
+            'Type',
+            'Count',
+            'Price per hour',
+            'Total Instances/Size',
+            'Total cost per month',
+        ]
+        table.align = 'l'
+
+        for result in self.results:
+            table.add_row([result.account_id, '', '', '', '', '', '', ''])
+            if result.error is not None:
+                table.add_row(['', '', 'error', result.error, '', '', '', ''])
+                continue
+            for region, costs in result.regions.items():
+                table.add_row(['', region, '', '', '', '', '', ''])
+                for service, cost in costs.items():
+                    for label, count, quantity, price, line_cost in cost.lines():
+                        if not count:
+                            continue
+                        table.add_row([
+                            '',
+                            '',
+                            service,
+                            label,
+                            count,
+                            '' if price is None else price,
+                            quantity,
+                            round(line_cost, 3),
+                        ])
+            table.add_row([
+                '', '', '', '', '', '', 'Account total',
+                round(result.total_cost, 3)
+            ])
+
+        table.add_row([
+            '', '', '', '', '', '', 'Total',
+            round(math.fsum(result.total_cost for result in self.results), 3)
+        ])
+        return table
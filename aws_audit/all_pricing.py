@@ -1,25 +1,68 @@
-import boto3
-import json
-import pprint 
-import re
-import sys
+from concurrent.futures import ThreadPoolExecutor
 
-from constants import (
+from aws_audit.constants import (
     region_short_names,
     aws_region
 )
 
-from connection import (
-    region,
-    session,
-    ec2,
-    pricing_client
+from aws_audit.connection import registry
+
+from aws_audit.decoding import (
+    decode_items,
+    decode_product
 )
+from aws_audit.offer_file import offer_items
+from aws_audit.price_index import PriceIndex
+from aws_audit.price_query import PriceQuery
+from aws_audit.pricing_cache import PricingCacheMiss
+from aws_audit.profiling import NULL_PROFILER
+
+# GetProducts query of each price list family
+PRICE_LIST_QUERIES = {
+    'EC2': PriceQuery('AmazonEC2')
+        .term_match('preInstalledSw', 'NA')
+        .term_match('operatingSystem', 'Linux')
+        .term_match('tenancy', 'Shared')
+        .term_match('licenseModel', 'No License required')
+        .term_match('capacitystatus', 'Used'),
+    'ELB': PriceQuery('AmazonEC2').term_match('productFamily', 'Load Balancer'),
+    'ELBV2': PriceQuery('AmazonEC2').term_match('productFamily', 'Load Balancer-Network'),
+    'Snapshots': PriceQuery('AmazonEC2').term_match('productFamily', 'Storage Snapshot'),
+    'EBS': PriceQuery('AmazonEC2').term_match('productFamily', 'Storage'),
+}
+
+# Keys an item of each price list family must contain to be decoded
+REQUIRED_KEYS = {
+    'EC2': ('instanceType',),
+    'EBS': ('volumeType', 'OnDemand'),
+    'ELB': ('OnDemand',),
+    'ELBV2': ('OnDemand',),
+    'Snapshots': ('OnDemand',),
+}
+
+# Reserved offer fields filled from a price dimension, by its unit
+RESERVED_PRICE_FIELDS = {
+    'Hrs': ('HrsUSD', 'HrsRateCode'),
+    'Quantity': ('UpfrontFeeUSD', 'QuantityRateCode'),
+}
 
 class pricing_info:
-    def __init__(self):
+    def __init__(
+        self,
+        cache=None,
+        refresh=False,
+        offline=False,
+        clients=registry,
+        region=None,
+        profiler=NULL_PROFILER
+    ):
         self.pricing = {}
-        self.price_item = []
+        self.clients = clients
+        self.region = region
+        self.profiler = profiler
+        self.cache = cache
+        self.refresh = refresh
+        self.offline = offline
         self.volume_types = {
             'gp2': 'General Purpose',
             'io1': 'Provisioned IOPS',
@@ -28,7 +71,6 @@ class pricing_info:
             'standard': 'Magnetic'
             }
         self.pricing_dict()
-        self.paginator_connection()
 
     def pricing_dict(self):
         for region in aws_region:
@@ -41,246 +83,339 @@ class pricing_info:
             }
     
     def paginator_connection(self):
-        return pricing_client.get_paginator('get_products')
+        return self.clients.pricing_client().get_paginator('get_products')
 
+    # Returns the description and USD price of the first price dimension.
+    # Nothing is stored on self so concurrent parses don't interfere.
     def onDemand_variables(self, terms, variable_type):
-        self.product_sku = list(terms[variable_type].keys())
-        self.pd = terms[variable_type][self.product_sku[0]]['priceDimensions']
-        self.product_price_sku = list(self.pd.keys())
-        self.price = self.pd[self.product_price_sku[0]]['pricePerUnit']['USD']
-        self.description = self.pd[self.product_price_sku[0]]['description']
+        product_sku = list(terms[variable_type].keys())
+        pd = terms[variable_type][product_sku[0]]['priceDimensions']
+        product_price_sku = list(pd.keys())
+        price = pd[product_price_sku[0]]['pricePerUnit']['USD']
+        description = pd[product_price_sku[0]]['description']
+        return description, price
+
+    # GetProducts query for a price list family, narrowed to the audited
+    # region when there is only one
+    def price_list_query(self, price_list_type):
+        query = PRICE_LIST_QUERIES[price_list_type]
+        if self.region is not None:
+            query = query.for_region(self.region)
+        return query
 
     def response_pages(self, price_list_type):
+        query = self.price_list_query(price_list_type)
+        return self.terms_list(self.query_items(query, price_list_type), price_list_type)
+
+    # Raw PriceList items of a query. A region query that is not cached is
+    # served from a fresh all-regions entry when there is one, filtered
+    # locally, so a single-region run reuses what an all-regions run cached.
+    def query_items(self, query, price_list_type):
+        items = self.cached_items(query.service_code, query.api_filters())
+        if items is None and self.region is not None:
+            unrestricted = PRICE_LIST_QUERIES[price_list_type]
+            items = self.cached_items(unrestricted.service_code, unrestricted.api_filters())
+            if items is not None:
+                items = self.region_items(items, query)
+        if items is None:
+            items = self.price_list_items(query.service_code, query.api_filters())
+        return items
+
+    # Items of an unrestricted entry that match a region query, the region
+    # code has to appear in the raw item before its product is decoded
+    def region_items(self, items, query):
+        needle = '"{}"'.format(self.region)
+        for raw in items:
+            if needle in raw and query.matches(decode_product(raw)):
+                yield raw
+
+    # Cached raw PriceList items, None when the cache has no fresh copy or
+    # is being refreshed
+    def cached_items(self, service_code, filters):
+        if self.cache is None or self.refresh:
+            return None
+        items = self.cache.get(service_code, filters)
+        if items is not None:
+            self.profiler.count('pricing_cache_hits', service_code=service_code)
+        else:
+            self.profiler.count('pricing_cache_misses', service_code=service_code)
+        return items
+
+    # Raw PriceList items fetched from the pricing API and written to the
+    # cache
+    def price_list_items(self, service_code, filters):
+        if self.offline:
+            raise PricingCacheMiss(
+                'No cached pricing for {} {} and --offline was given'.format(
+                    service_code, filters
+                )
+            )
+
+        items = self.fetch_price_list(service_code, filters)
+        if self.cache is not None:
+            items = self.cache.put(service_code, filters, items)
+        return items
+
+    # Pages are timed on their own so pagination can be told apart from
+    # decoding and parsing in a profile
+    def fetch_price_list(self, service_code, filters):
         paginator = self.paginator_connection()
-        if price_list_type == 'EC2':
-            resp_pages = paginator.paginate(ServiceCode='AmazonEC2',
-                                            Filters=[
-                                                {'Type':'TERM_MATCH', 
-                                                'Field':'preInstalledSw', 
-                                                'Value':'NA'},
-                                                {'Type':'TERM_MATCH', 
-                                                'Field':'operatingSystem', 
-                                                'Value':'Linux'},
-                                                {'Type':'TERM_MATCH', 
-                                                'Field':'tenancy', 
-                                                'Value':'Shared'},
-                                                {'Type':'TERM_MATCH', 
-                                                'Field':'licenseModel', 
-                                                'Value':'No License required'},
-                                                {'Type':'TERM_MATCH', 
-                                                'Field':'capacitystatus', 
-                                                'Value':'Used'}
-                                            ])
-        
-        if price_list_type == 'ELB':
-            resp_pages = paginator.paginate(ServiceCode='AmazonEC2',
-                                        Filters=[
-                                            {'Type':'TERM_MATCH', 
-                                            'Field':'productFamily', 
-                                            'Value':'Load Balancer'},
-                                            ])
-
-        if price_list_type == 'ELBV2':
-            resp_pages = paginator.paginate(ServiceCode='AmazonEC2',
-                                        Filters=[
-                                            {'Type':'TERM_MATCH', 
-                                            'Field':'productFamily', 
-                                            'Value':'Load Balancer-Network'},
-                                            ])
-        if price_list_type == 'Snapshots':
-            resp_pages = paginator.paginate(ServiceCode="AmazonEC2",
-                                        Filters=[
-                                            {'Type': 'TERM_MATCH', 
-                                            'Field': 'productFamily', 
-                                            'Value': 'Storage Snapshot'}
-                                            ]
-                                            )
-        if price_list_type == 'EBS':
-            resp_pages = paginator.paginate(ServiceCode='AmazonEC2',
-                                        Filters=[
-                                            {'Type':'TERM_MATCH', 
-                                            'Field':'productFamily', 
-                                            'Value':'Storage'},
-                                            ])
-        
-        self.terms_list(resp_pages)
-    
-    def terms_list(self, resp_pages):
+        resp_pages = self.profiler.iterate(
+            paginator.paginate(ServiceCode=service_code, Filters=filters),
+            'get_products',
+            service_code=service_code
+        )
         for page in resp_pages:
             for item in page['PriceList']:
-                self.price_item.append(json.loads(item))
+                yield item
 
-    def price_list_ELBV2(self):
-        self.response_pages('ELBV2')
-        for item in self.price_item:
-            terms = item['terms']
-            if 'OnDemand' in terms:
-                region = region_short_names[item['product']['attributes']['location']]
-                self.onDemand_variables(terms, 'OnDemand')
+    # Decode the items one at a time, nothing is kept once it is parsed.
+    # Items of unknown locations or volume types are dropped before their
+    # terms are decoded.
+    def terms_list(self, price_list, price_list_type):
+        if price_list_type == 'EBS':
+            accept = self.known_volume
+        else:
+            accept = self.known_location
+        return decode_items(
+            price_list,
+            required_keys=REQUIRED_KEYS[price_list_type],
+            accept=accept
+        )
 
-                if not 'OnDemand' in self.pricing[region]['ELBV2']:
-                    self.pricing[region]['ELBV2']['OnDemand'] = {}
+    def known_location(self, attributes):
+        return attributes.get('location') in region_short_names
 
-                self.pricing[region]['ELBV2']['OnDemand'] = {
-                                'Description': self.description,
-                                'UsageType': item['product']['attributes']['usagetype'],
-                                'Location': item['product']['attributes']['location'],
-                                'USD': self.price
-                                }
+    def known_volume(self, attributes):
+        return (
+            self.known_location(attributes)
+            and attributes.get('volumeType') in self.volume_types.values()
+        )
+
+    # Fetch every price list family concurrently. Each family only writes
+    # its own pricing[region][family] table, and those tables are all
+    # created up front by pricing_dict, so the workers never share a dict.
+    def price_lists(self, workers=5):
+        price_list_functions = [
+            self.price_list_ELBV2,
+            self.price_list_ELB,
+            self.price_list_EBS,
+            self.price_list_EC2,
+            self.price_list_snapshots
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(f) for f in price_list_functions]
+            for future in futures:
+                future.result()
         return self.pricing
 
-    def price_list_EBS(self):
-        self.response_pages('EBS')
-        for item in self.price_item:
-            terms = item['terms']
-            if 'volumeType' in item['product']['attributes']:
-                volume_type = list(self.volume_types.keys())[list(self.volume_types.values()).index(item['product']['attributes']['volumeType'])]
-
-                if 'OnDemand' in terms:
-                    region = region_short_names[item['product']['attributes']['location']]
-                    self.onDemand_variables(terms, 'OnDemand')
-
-                    if not volume_type in self.pricing[region]['EBS']:
-                        self.pricing[region]['EBS'][volume_type] = {}
-                    if not 'OnDemand' in self.pricing[region]['EBS'][volume_type]:
-                        self.pricing[region]['EBS'][volume_type]['OnDemand'] = {}
-
-                    self.pricing[region]['EBS'][volume_type]['OnDemand'] = {
-                                    'Description': self.description,
-                                    'UsageType': item['product']['attributes']['usagetype'],
-                                    'Location': item['product']['attributes']['location'],
-                                    'Max Volume Size': item['product']['attributes']['maxVolumeSize'],
-                                    'USD': self.price
-                                    }
+    # Fill all five tables in a single pass over a local bulk offer file
+    # (JSON or CSV, optionally gzipped) instead of calling the pricing API
+    def load_offer_file(self, path):
+        parsers = self.item_parsers()
+        items = dict.fromkeys(parsers, 0)
+        with self.profiler.phase('offer_file'):
+            for families, item in offer_items(path, self.offer_families):
+                for price_list_type in families:
+                    parsers[price_list_type](item)
+                    items[price_list_type] += 1
+        for price_list_type, count in items.items():
+            self.profiler.count('items_parsed', count, family=price_list_type)
         return self.pricing
-    
-    def price_list_snapshots(self):
-        self.response_pages('Snapshots')
-        for item in self.price_item:
-            terms = item['terms']
-            if 'OnDemand' in terms:
-                region = region_short_names[item['product']['attributes']['location']]
-                self.onDemand_variables(terms, 'OnDemand')
-                
-                if not 'OnDemand' in self.pricing[region]['Snapshots']:
-                    self.pricing[region]['Snapshots']['OnDemand'] = {}
 
-                self.pricing[region]['Snapshots']['OnDemand'] = {
-                                'Description': self.description,
-                                'UsageType': item['product']['attributes']['usagetype'],
-                                'Location': item['product']['attributes']['location'],
-                                'USD': self.price
-                                }
+    # Price list families a product from an offer file belongs to, using
+    # the same queries and checks as the GetProducts path
+    def offer_families(self, product):
+        attributes = product.get('attributes', {})
+        families = []
+        for price_list_type in PRICE_LIST_QUERIES:
+            if price_list_type == 'EBS':
+                accept = self.known_volume
+            else:
+                accept = self.known_location
+            query = self.price_list_query(price_list_type)
+            if query.matches(product) and accept(attributes):
+                families.append(price_list_type)
+        return families
+
+    # Per-item parser of each price list family
+    def item_parsers(self):
+        return {
+            'EC2': self.parse_EC2,
+            'ELB': self.parse_ELB,
+            'ELBV2': self.parse_ELBV2,
+            'EBS': self.parse_EBS,
+            'Snapshots': self.parse_snapshots,
+        }
+
+    # Flat index of the parsed prices, see price_index.PriceIndex
+    def price_index(self):
+        with self.profiler.phase('price_index'):
+            return PriceIndex.from_pricing(self.pricing)
+
+    # Fetch, decode and parse one price list family
+    def parse_price_list(self, price_list_type):
+        parse = self.item_parsers()[price_list_type]
+        items = 0
+        with self.profiler.phase('price_list', family=price_list_type):
+            for item in self.response_pages(price_list_type):
+                parse(item)
+                items += 1
+        self.profiler.count('items_parsed', items, family=price_list_type)
         return self.pricing
 
-    def price_list_ELB(self):
-        self.response_pages('ELB')
-        for item in self.price_item:
-            terms = item['terms']
+    def price_list_ELBV2(self):
+        return self.parse_price_list('ELBV2')
+
+    def parse_ELBV2(self, item):
+        terms = item['terms']
+        if 'OnDemand' in terms:
+            region = region_short_names[item['product']['attributes']['location']]
+            description, price = self.onDemand_variables(terms, 'OnDemand')
+
+            if not 'OnDemand' in self.pricing[region]['ELBV2']:
+                self.pricing[region]['ELBV2']['OnDemand'] = {}
+
+            self.pricing[region]['ELBV2']['OnDemand'] = {
+                            'Description': description,
+                            'UsageType': item['product']['attributes']['usagetype'],
+                            'Location': item['product']['attributes']['location'],
+                            'USD': price
+                            }
+
+    def price_list_EBS(self):
+        return self.parse_price_list('EBS')
+
+    def parse_EBS(self, item):
+        terms = item['terms']
+        if 'volumeType' in item['product']['attributes']:
+            volume_type = list(self.volume_types.keys())[list(self.volume_types.values()).index(item['product']['attributes']['volumeType'])]
+
             if 'OnDemand' in terms:
                 region = region_short_names[item['product']['attributes']['location']]
-                self.onDemand_variables(terms, 'OnDemand')
+                description, price = self.onDemand_variables(terms, 'OnDemand')
 
-                if not 'OnDemand' in self.pricing[region]['ELB']:
-                    self.pricing[region]['ELB']['OnDemand'] = {}
+                if not volume_type in self.pricing[region]['EBS']:
+                    self.pricing[region]['EBS'][volume_type] = {}
+                if not 'OnDemand' in self.pricing[region]['EBS'][volume_type]:
+                    self.pricing[region]['EBS'][volume_type]['OnDemand'] = {}
 
-                self.pricing[region]['ELB']['OnDemand'] = {
-                                'Description': self.description,
+                self.pricing[region]['EBS'][volume_type]['OnDemand'] = {
+                                'Description': description,
                                 'UsageType': item['product']['attributes']['usagetype'],
                                 'Location': item['product']['attributes']['location'],
-                                'USD': self.price
+                                'Max Volume Size': item['product']['attributes']['maxVolumeSize'],
+                                'USD': price
                                 }
-        return self.pricing
-        
+
+    def price_list_snapshots(self):
+        return self.parse_price_list('Snapshots')
+
+    def parse_snapshots(self, item):
+        terms = item['terms']
+        if 'OnDemand' in terms:
+            region = region_short_names[item['product']['attributes']['location']]
+            description, price = self.onDemand_variables(terms, 'OnDemand')
+
+            if not 'OnDemand' in self.pricing[region]['Snapshots']:
+                self.pricing[region]['Snapshots']['OnDemand'] = {}
+
+            self.pricing[region]['Snapshots']['OnDemand'] = {
+                            'Description': description,
+                            'UsageType': item['product']['attributes']['usagetype'],
+                            'Location': item['product']['attributes']['location'],
+                            'USD': price
+                            }
+
+    def price_list_ELB(self):
+        return self.parse_price_list('ELB')
+
+    def parse_ELB(self, item):
+        terms = item['terms']
+        if 'OnDemand' in terms:
+            region = region_short_names[item['product']['attributes']['location']]
+            description, price = self.onDemand_variables(terms, 'OnDemand')
+
+            if not 'OnDemand' in self.pricing[region]['ELB']:
+                self.pricing[region]['ELB']['OnDemand'] = {}
+
+            self.pricing[region]['ELB']['OnDemand'] = {
+                            'Description': description,
+                            'UsageType': item['product']['attributes']['usagetype'],
+                            'Location': item['product']['attributes']['location'],
+                            'USD': price
+                            }
+
     def price_list_EC2(self):
-        self.response_pages('EC2')
-        for item in self.price_item:
-            terms = item['terms']
-            if 'instanceType' in item['product']['attributes']:
-                instance_type = item['product']['attributes']['instanceType']
-                region = region_short_names[item['product']['attributes']['location']]
+        return self.parse_price_list('EC2')
 
-                if 'OnDemand' in terms:
-                    self.onDemand_variables(terms, 'OnDemand')
+    def parse_EC2(self, item):
+        terms = item['terms']
+        if 'instanceType' in item['product']['attributes']:
+            instance_type = item['product']['attributes']['instanceType']
+            region = region_short_names[item['product']['attributes']['location']]
 
-                    if not instance_type in self.pricing[region]['EC2']:
-                        self.pricing[region]['EC2'][instance_type] = {}
+            if 'OnDemand' in terms:
+                description, price = self.onDemand_variables(terms, 'OnDemand')
 
-                    if not 'OnDemand' in self.pricing[region]['EC2'][instance_type]:
-                        self.pricing[region]['EC2'][instance_type]['OnDemand'] = {}
+                if not instance_type in self.pricing[region]['EC2']:
+                    self.pricing[region]['EC2'][instance_type] = {}
 
-                    usageType = item['product']['attributes']['usagetype']
+                if not 'OnDemand' in self.pricing[region]['EC2'][instance_type]:
+                    self.pricing[region]['EC2'][instance_type]['OnDemand'] = {}
 
-                    if re.search('.*BoxUsage:{}'.format(instance_type),usageType):
-                        self.pricing[region]['EC2'][instance_type]['OnDemand'] = {
-                                'Description': self.description,
-                                'UsageType': item['product']['attributes']['usagetype'],
-                                'Location': item['product']['attributes']['location'],
-                                'Tenancy': item['product']['attributes']['tenancy'],
-                                'Operating System': item['product']['attributes']['operatingSystem'],
-                                'USD': self.price
-                                } 
-
-                if 'Reserved' in terms:
-                    for reserved_sku in terms['Reserved'].keys():
-                        term_attributes = terms['Reserved'][reserved_sku]['termAttributes']
-                        price_dimensions = terms['Reserved'][reserved_sku]['priceDimensions']
-                        ri_purchase_option = term_attributes['PurchaseOption'] 
-
-                        if not instance_type in self.pricing[region]['EC2']:
-                            self.pricing[region]['EC2'][instance_type] = {}
-
-                        if not 'Reserved' in self.pricing[region]['EC2'][instance_type]:
-                            self.pricing[region]['EC2'][instance_type]['Reserved'] = {}
-
-                        if not ri_purchase_option in self.pricing[region]['EC2'][instance_type]['Reserved']:
-                            self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option] = {}
-
-                        if term_attributes['OfferingClass'] == 'standard' and term_attributes['LeaseContractLength'] == '1yr':
-                            if ri_purchase_option == 'Partial Upfront':
-                                self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option] = {
-                                    'QuantityRateCode': '',
-                                    'HrsRateCode': '',
-                                    'Offering_Class': term_attributes['OfferingClass'],
-                                    'PurchaseOption': ri_purchase_option,
-                                    'HrsUSD': '',
-                                    'UpfrontFeeUSD': ''
-                                }
-                                for price_dimension in price_dimensions:
-                                    if price_dimensions[price_dimension]['unit'] == 'Quantity':
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['UpfrontFeeUSD'] = price_dimensions[price_dimension]['pricePerUnit']['USD']
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['QuantityRateCode'] = price_dimensions[price_dimension]['rateCode']
-                                    if price_dimensions[price_dimension]['unit']  == 'Hrs':
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['HrsUSD'] = price_dimensions[price_dimension]['pricePerUnit']['USD']
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['HrsRateCode'] = price_dimensions[price_dimension]['rateCode']
-                            
-                            if ri_purchase_option == 'All Upfront':
-                                self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option] = {
-                                    'QuantityRateCode': '',
-                                    'HrsRateCode': '',
-                                    'Offering_Class': term_attributes['OfferingClass'],
-                                    'PurchaseOption': ri_purchase_option,
-                                    'HrsUSD': '',
-                                    'UpfrontFeeUSD': ''
-                                }
-                                for price_dimension in price_dimensions:
-                                    if price_dimensions[price_dimension]['unit'] == 'Quantity':
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['UpfrontFeeUSD'] = price_dimensions[price_dimension]['pricePerUnit']['USD']
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['QuantityRateCode'] = price_dimensions[price_dimension]['rateCode']
-                                    if price_dimensions[price_dimension]['unit']  == 'Hrs':
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['HrsUSD'] = price_dimensions[price_dimension]['pricePerUnit']['USD']
-                                        self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['HrsRateCode'] = price_dimensions[price_dimension]['rateCode']
-                            
-                            if ri_purchase_option == 'No Upfront':
-                                self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option] = {
-                                    'RateCode': '',
-                                    'Offering_Class': term_attributes['OfferingClass'],
-                                    'PurchaseOption': ri_purchase_option,
-                                    'USD': ''
-                                }
-                                for price_dimension in price_dimensions:
-                                    self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['RateCode'] = price_dimensions[price_dimension]['rateCode']
-                                    self.pricing[region]['EC2'][instance_type]['Reserved'][ri_purchase_option]['USD'] = price_dimensions[price_dimension]['pricePerUnit']['USD']
-        return self.pricing       
-     
-price = pricing_info()
\ No newline at end of file
+                usageType = item['product']['attributes']['usagetype']
+
+                if usageType.endswith('BoxUsage:' + instance_type):
+                    self.pricing[region]['EC2'][instance_type]['OnDemand'] = {
+                            'Description': description,
+                            'UsageType': item['product']['attributes']['usagetype'],
+                            'Location': item['product']['attributes']['location'],
+                            'Tenancy': item['product']['attributes']['tenancy'],
+                            'Operating System': item['product']['attributes']['operatingSystem'],
+                            'USD': price
+                            } 
+
+            if 'Reserved' in terms:
+                if not instance_type in self.pricing[region]['EC2']:
+                    self.pricing[region]['EC2'][instance_type] = {}
+
+                if not 'Reserved' in self.pricing[region]['EC2'][instance_type]:
+                    self.pricing[region]['EC2'][instance_type]['Reserved'] = {}
+
+                self.reserved_terms(
+                    terms['Reserved'],
+                    self.pricing[region]['EC2'][instance_type]['Reserved']
+                )
+
+    # Decode every reserved offer of a SKU in one pass into
+    # reserved[lease length][offering class][purchase option]. Each price
+    # dimension fills the fields RESERVED_PRICE_FIELDS maps its unit to,
+    # so dimensions of one offer may arrive in separate items.
+    def reserved_terms(self, reserved_terms, reserved):
+        for term in reserved_terms.values():
+            term_attributes = term['termAttributes']
+            lease_length = term_attributes['LeaseContractLength']
+            offering_class = term_attributes['OfferingClass']
+            ri_purchase_option = term_attributes['PurchaseOption']
+
+            offers = reserved.setdefault(lease_length, {}).setdefault(offering_class, {})
+            if ri_purchase_option not in offers:
+                offers[ri_purchase_option] = {
+                    'LeaseContractLength': lease_length,
+                    'Offering_Class': offering_class,
+                    'PurchaseOption': ri_purchase_option,
+                    'HrsRateCode': '',
+                    'HrsUSD': '',
+                    'QuantityRateCode': '',
+                    'UpfrontFeeUSD': ''
+                }
+            offer = offers[ri_purchase_option]
+
+            for price_dimension in term['priceDimensions'].values():
+                fields = RESERVED_PRICE_FIELDS.get(price_dimension['unit'])
+                if fields is None:
+                    continue
+                price_field, rate_code_field = fields
+                offer[price_field] = price_dimension['pricePerUnit']['USD']
+                offer[rate_code_field] = price_dimension['rateCode']
@@ -0,0 +1,33 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Files written to a temporary name in their directory and renamed into
+# place once complete, so readers (and concurrent runs) never see a
+# partial file and a run that dies mid-write leaves the previous one
+# intact. Leftover temporary files start with TMP_PREFIX.
+
+TMP_PREFIX = '.tmp-'
+
+
+# Text file opened for writing, replacing path when the block exits
+# normally; on an error (or a generator writing it being closed early)
+# the temporary file is removed and path is left untouched
+@contextmanager
+def atomic_write(path):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory,
+        prefix=TMP_PREFIX,
+        suffix=os.path.splitext(path)[1]
+    )
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,57 +1,310 @@
 #!/usr/bin/env python3
 # Provides attached/unattached instances for ELB for all regions
-import boto3
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 import pprint
-from prettytable import PrettyTable
 import argparse
 import sys
-# from aws_audit.all_pricing import pricing_info
-from all_pricing import pricing_info
-
-# Parser for command line
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    '--allpricing',
-    '-a',
-    help='pricing report for all regions',
+import threading
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    as_completed
+)
+from aws_audit.all_pricing import pricing_info
+from aws_audit.inventory import (
+    INSTANCE_STATE_CODES,
+    InstanceRecord,
+    VolumeRecord
+)
+from aws_audit.constants import DEFAULT_DAEMON_URL
+from aws_audit.cost import CostEngine
+from aws_audit.connection import (
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_MAX_POOL_CONNECTIONS,
+    DEFAULT_RETRY_MODE,
+    RETRY_MODES,
+    registry
 )
-parser.add_argument(
-    'region', help='pricing report for that region'
+from aws_audit.pricing_cache import (
+    DEFAULT_CACHE_DIR,
+    PricingCache,
+    PricingCacheMiss
 )
-parser.add_argument(
-    '--pricing', '-p', help='get pricing for a region', action = 'store_true'
+from aws_audit.inventory_state import (
+    DEFAULT_FULL_EVERY,
+    DEFAULT_STATE_DIR,
+    InventoryStore,
+    RegionState
 )
-parser.add_argument(
-    '--resources', '-r', help='get reources for a region', action = 'store_true'
+from aws_audit.profiling import (
+    NULL_PROFILER,
+    ProfileOutput,
+    Profiler
 )
-args = parser.parse_args()
-
-# Creating Table
-x = PrettyTable()
-x.field_names = [
-    'Region',
-    'Service',
-    'Instance_Type',
-    'Count',
-    'Price per hour',
-    'Total Instances/Size',
-    'Total cost per month',
-]
-x.align = 'l'
-
-y = PrettyTable()
-y.field_names = [
-    'Region',
-    'Service',
-    'Instance_Type',
-    'Count',
-    'Price per hour',
-    'Total Instances/Size'
-]
-y.align = 'l'
+from aws_audit.report import (
+    REPORT_WRITERS,
+    ReportRow,
+    change_rows,
+    cost_rows
+)
+from aws_audit.rate_limit import (
+    DEFAULT_MAX_RATE,
+    AdaptiveRateLimiter
+)
+from aws_audit.sqlite_store import InventoryDatabase
+
+# Role assumed in accounts listed by id in --accounts
+DEFAULT_ROLE_NAME = 'OrganizationAccountAccessRole'
+
+# Parser for command line
+def build_parser():
+    parser = argparse.ArgumentParser(prog='aws-audit')
+    parser.add_argument(
+        '--allpricing',
+        '-a',
+        help='pricing report for all regions',
+    )
+    parser.add_argument(
+        'region', help='pricing report for that region', nargs='?'
+    )
+    parser.add_argument(
+        '--pricing', '-p', help='get pricing for a region', action = 'store_true'
+    )
+    parser.add_argument(
+        '--resources', '-r', help='get reources for a region', action = 'store_true'
+    )
+    parser.add_argument(
+        '--workers',
+        help='number of regions and services discovered concurrently',
+        type=int,
+        default=16
+    )
+    parser.add_argument(
+        '--page-size',
+        help='items requested per describe_* page',
+        type=int,
+        default=1000
+    )
+    parser.add_argument(
+        '--max-pool-connections',
+        help='HTTP connections kept open per AWS client',
+        type=int,
+        default=DEFAULT_MAX_POOL_CONNECTIONS
+    )
+    parser.add_argument(
+        '--retry-mode',
+        help='botocore retry mode of AWS calls',
+        choices=RETRY_MODES,
+        default=DEFAULT_RETRY_MODE
+    )
+    parser.add_argument(
+        '--max-attempts',
+        help='attempts per AWS call before it fails, the first one included',
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS
+    )
+    parser.add_argument(
+        '--max-request-rate',
+        help='requests per second per service and region, lowered while '
+        'AWS throttles; 0 turns rate limiting off',
+        type=float,
+        default=DEFAULT_MAX_RATE
+    )
+    add_pricing_arguments(parser)
+    parser.add_argument(
+        '--price-source',
+        help='load prices from the pricing API, a cache or offer file (api), '
+        'or ask a running aws-pricing-daemon (daemon)',
+        choices=['api', 'daemon'],
+        default='api'
+    )
+    parser.add_argument(
+        '--daemon-url',
+        help='pricing daemon address, http://host:port or unix:///path/to.sock',
+        default=DEFAULT_DAEMON_URL
+    )
+    parser.add_argument(
+        '--pipeline',
+        help='overlap pricing with discovery and print each region as soon '
+        'as it is ready',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '--accounts',
+        help='file of account ids or role ARNs to audit, one per line'
+    )
+    parser.add_argument(
+        '--role-name',
+        help='role assumed in accounts given by id',
+        default=DEFAULT_ROLE_NAME
+    )
+    parser.add_argument(
+        '--account-workers',
+        help='number of accounts audited concurrently, one process each',
+        type=int,
+        default=os.cpu_count() or 1
+    )
+    parser.add_argument(
+        '--profile',
+        help='write per-phase timings and API call counts to this file, '
+        'streamed one record per line when it ends in .ndjson'
+    )
+    parser.add_argument(
+        '--incremental',
+        help='only describe snapshots started since the previous run and '
+        'report what changed',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '--state-dir',
+        help='directory of the inventory saved between incremental runs',
+        default=DEFAULT_STATE_DIR
+    )
+    parser.add_argument(
+        '--full-every',
+        help='hours between full snapshot fetches in incremental mode',
+        type=float,
+        default=DEFAULT_FULL_EVERY / (60 * 60)
+    )
+    parser.add_argument(
+        '--output-format',
+        help='report format, ndjson and csv rows are written region by region',
+        choices=['table'] + list(REPORT_WRITERS),
+        default='table'
+    )
+    parser.add_argument(
+        '--output', help='write the reports to this file instead of stdout'
+    )
+    parser.add_argument(
+        '--sqlite',
+        help='store the inventory and prices in this SQLite database and '
+        'compute the pricing report from it'
+    )
+    return parser
+
+
+# Options prices are loaded with, shared with aws-pricing-daemon
+def add_pricing_arguments(parser):
+    parser.add_argument(
+        '--refresh-pricing',
+        help='ignore the pricing cache and fetch prices from the pricing API',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '--offline',
+        help='only use cached pricing, never call the pricing API',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '--clear-cache',
+        help='delete every cached price list before loading prices',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '--offer-file',
+        help='read prices from a local AmazonEC2 bulk offer file (JSON or CSV) '
+        'instead of the pricing API'
+    )
+    parser.add_argument(
+        '--cache-dir', help='pricing cache directory', default=DEFAULT_CACHE_DIR
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        help='hours before cached pricing is fetched again',
+        type=float,
+        default=24
+    )
+    parser.add_argument(
+        '--pricing-workers',
+        help='number of price lists fetched concurrently',
+        type=int,
+        default=5
+    )
+    parser.add_argument(
+        '--cache-max-size',
+        help='pricing cache size limit in MB',
+        type=int,
+        default=512
+    )
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Worker processes of a multi-account audit only send back costs,
+    # there is no inventory to store
+    if args.accounts and args.sqlite:
+        parser.error('--sqlite cannot be used with --accounts')
+    # Prices are loaded once before any account is audited, there is no
+    # discovery to overlap them with
+    if args.accounts and args.pipeline:
+        parser.error('--pipeline cannot be used with --accounts')
+    # Nothing would be left to price from
+    if args.clear_cache and args.offline:
+        parser.error('--clear-cache cannot be used with --offline')
+    return args
+
+
+# Creating Table, prettytable is only imported once a report is rendered
+def pricing_table():
+    from prettytable import PrettyTable
+
+    x = PrettyTable()
+    x.field_names = [
+        'Region',
+        'Service',
+        'Instance_Type',
+        'Count',
+        'Price per hour',
+        'Total Instances/Size',
+        'Total cost per month',
+    ]
+    x.align = 'l'
+    return x
+
+
+def changes_table():
+    from prettytable import PrettyTable
+
+    z = PrettyTable()
+    z.field_names = ['Region', 'Service', 'Resource', 'Change', 'Detail']
+    z.align = 'l'
+    return z
+
+
+def resources_table():
+    from prettytable import PrettyTable
+
+    y = PrettyTable()
+    y.field_names = [
+        'Region',
+        'Service',
+        'Instance_Type',
+        'Count',
+        'Price per hour',
+        'Total Instances/Size'
+    ]
+    y.align = 'l'
+    return y
+
+# Table cell for a unit price, empty when the price list has no entry
+def price_cell(price, digits=None):
+    if price is None:
+        return ''
+    if digits is None:
+        return price
+    return round(price, digits)
+
+
+# Largest page each describe_* paginator accepts
+MAX_PAGE_SIZE = {
+    ('ec2', 'describe_instances'): 1000,
+    ('ec2', 'describe_volumes'): 500,
+    ('ec2', 'describe_snapshots'): 1000,
+    ('elb', 'describe_load_balancers'): 400,
+    ('elbv2', 'describe_load_balancers'): 400,
+}
 
 # To fix datetime object not serializable
 class DateTimeEncoder(json.JSONEncoder):
@@ -65,41 +318,122 @@ class DateTimeEncoder(json.JSONEncoder):
 
 
 class AWSAudit:
-    def __init__(self):
+    def __init__(self, args=None, clients=registry, profiler=None):
+        self.args = args if args is not None else parse_args([])
+        self.clients = clients
+        if profiler is None:
+            profiler = Profiler() if self.args.profile else NULL_PROFILER
+        self.profiler = profiler
+        self.state_store = None
+        if self.args.incremental:
+            self.state_store = InventoryStore(self.args.state_dir)
+        self.snapshot_states = {}
+        self.changes = {}
+        self.output = sys.stdout
+        self.report_writer = None
+        self.database = None
+        self.audit_id = None
+        self.rate_limiter = None
         self.resources = {}
         self.dictionary = {}
         self.volume_ebs = {}
-        self.snap_vol_id = []
         self.aws_region = []
-        self.attached_vol_list = []
-        self.unattached_vol_list = []
+        self.page_counts = {}
+        self.page_counts_lock = threading.Lock()
         self.state = 'running'
         self.per_month_hours = 730.5
-        self.con = self.connect_service('ec2')
-        self.sts_client = self.connect_service('sts')
-        self.aws_regions = self.region(self.aws_region)
+
+    # Connect and resolve the regions to audit
+    def prepare(self):
+        self.configure_clients()
+        with self.profiler.phase('prepare'):
+            self.con = self.connect_service('ec2')
+            self.sts_client = self.connect_service('sts')
+            self.aws_regions = self.region(self.aws_region)
 
         self.initialize_resource_dict(self.aws_regions)
-        self.get_ec2_resources(self.aws_regions)
-        self.get_classic_elb_resources(self.aws_regions)
-        self.get_network_elb_resources(self.aws_regions)
-        self.get_ebs_resources(self.aws_regions)
-        if args.resources:
+        return self.aws_regions
+
+    # Client settings and the rate limiter shared by every AWS call, set
+    # before the clients are created. The limiter is attached once per
+    # registry; its counters go to the profiler of the last audit that
+    # profiles.
+    def configure_clients(self):
+        self.clients.configure(
+            max_pool_connections=self.args.max_pool_connections,
+            retry_mode=self.args.retry_mode,
+            max_attempts=self.args.max_attempts
+        )
+        if self.rate_limiter is None and self.args.max_request_rate > 0:
+            self.rate_limiter = self.clients.shared_rate_limiter(
+                lambda clients: AdaptiveRateLimiter(
+                    self.args.max_request_rate
+                ).attach(clients)
+            )
+        if self.rate_limiter is not None and self.profiler is not NULL_PROFILER:
+            self.rate_limiter.profiler = self.profiler
+
+    # Run the audit and print the requested reports, with --profile the
+    # profile is written once the audit is done or has failed
+    def run(self):
+        profile = None
+        if self.args.profile:
+            profile = ProfileOutput(self.profiler, self.args.profile)
+        self.profiler.attach(self.clients)
+        output = None
+        if self.args.output:
+            output = self.output = open(self.args.output, 'w', newline='')
+        if self.args.output_format != 'table':
+            self.report_writer = REPORT_WRITERS[self.args.output_format](self.output)
+        if self.args.sqlite:
+            self.database = InventoryDatabase(self.args.sqlite)
+            self.audit_id = self.database.start_audit(self.per_month_hours)
+        try:
+            return self.audit()
+        finally:
+            self.profiler.detach()
+            if self.database is not None:
+                self.database.close()
+            if output is not None:
+                output.close()
+            if profile is not None:
+                profile.close()
+
+    def audit(self):
+        self.prepare()
+        if self.args.pipeline:
+            from aws_audit.pipeline import AuditPipeline
+
+            return AuditPipeline(self, self.args.workers).run()
+
+        with self.profiler.phase('discovery'):
+            self.discover_resources(self.aws_regions, self.args.workers)
+        if self.database is not None:
+            for region_name in self.aws_regions:
+                self.store_region(region_name)
+        if self.state_store is not None:
+            for region_name in self.aws_regions:
+                self.report_changes(region_name, self.update_state(region_name))
+        if self.report_writer is not None:
+            self.write_reports(self.aws_regions)
+            return self
+
+        if self.args.resources:
             self.get_resources(
                 self.aws_regions,
                 self.volume_ebs,
             )
 
-        if args.pricing:
+        if self.args.pricing:
             self.get_price(
                 self.aws_regions,
                 self.volume_ebs,
             )
-        
+        return self
 
     def region(self, aws_region):
-        if args.region:
-            aws_region = [args.region]
+        if self.args.region:
+            aws_region = [self.args.region]
         else:
             aws_region = [
                 d['RegionName']for d in self.con.describe_regions()['Regions']
@@ -109,10 +443,10 @@ class AWSAudit:
     def connect_service_region(
         self, service, region_name=None
     ):
-        return boto3.client(service, region_name)
+        return self.clients.client(service, region_name)
 
     def connect_service(self, service):
-        return boto3.client(service)
+        return self.clients.client(service)
 
     def initialize_resource_dict(self, regions):
         resources_dict = {}
@@ -121,19 +455,109 @@ class AWSAudit:
                 'ELB': {},
                 'ELBV2': {},
                 'EC2': {},
-                'EBS': {'orphaned_snapshots': []},
+                'EBS': {},
+                'Volumes': {'attached': set(), 'unattached': set()},
+                'Snapshots': {'attached': 0, 'orphaned': 0, 'size': 0},
             }
         self.dictionary = resources_dict
 
+    # Fan discovery out per region and per service. Collectors only
+    # return their sections of the region's resource dict, which are
+    # merged here on the calling thread.
+    def discover_resources(self, regions, workers):
+        self.identify()
+        collectors = self.collectors()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {}
+            for region_name in regions:
+                for service in collectors:
+                    future = executor.submit(self.collect, service, region_name)
+                    futures[future] = (region_name, service)
+
+            for future in as_completed(futures):
+                region_name, service = futures[future]
+                self.dictionary[region_name].update(future.result())
+
+    # Collector of each resource section, called with a region name
+    def collectors(self):
+        return {
+            'EC2': self.ec2_resources,
+            'ELB': self.classic_elb_resources,
+            'ELBV2': self.network_elb_resources,
+            'EBS': self.ebs_resources,
+        }
+
+    # Sections of one service in one region, timed per collector
+    def collect(self, service, region_name):
+        with self.profiler.phase('discover', service=service, region=region_name):
+            return self.collectors()[service](region_name)
+
+    # Yield the pages of a describe_* call one at a time, counting them
+    # per region in self.page_counts
+    def paginate(self, conn, service, operation, region_name, **kwargs):
+        page_size = min(
+            self.args.page_size,
+            MAX_PAGE_SIZE[(service, operation)]
+        )
+        paginator = conn.get_paginator(operation)
+        pages = paginator.paginate(
+            PaginationConfig={'PageSize': page_size},
+            **kwargs
+        )
+        page_count = 0
+        for page in pages:
+            page_count += 1
+            yield page
+
+        with self.page_counts_lock:
+            region_pages = self.page_counts.setdefault(region_name, {})
+            region_pages['{}:{}'.format(service, operation)] = page_count
+
+    # Number of describe_* pages fetched in a region, per operation
+    def region_page_counts(self, region_name):
+        return self.page_counts.get(region_name, {})
+
+    def account_id(self):
+        sts_response = self.sts_client.get_caller_identity()
+        return sts_response['Account']
+
+    # Account audited, also recorded in the database with --sqlite
+    def identify(self):
+        self.user_account = self.account_id()
+        if self.database is not None:
+            self.database.set_account(self.audit_id, self.user_account)
+        return self.user_account
+
+    # Store a discovered region in the --sqlite database. The snapshot ids
+    # and network load balancer names only kept for it are dropped from
+    # the resource dict once stored.
+    def store_region(self, region_name):
+        resources = self.dictionary[region_name]
+        with self.profiler.phase('store', region=region_name):
+            self.database.add_region(
+                self.audit_id,
+                region_name,
+                resources,
+                resources.pop('SnapshotIds', ()),
+                resources['ELBV2'].pop('Names', ())
+            )
+
     # Get EC2 resources
     def get_ec2_resources(self, regions):
         for region_name in regions:
-            conn = self.connect_service_region(
-                'ec2',
-                region_name=region_name
-            )
-            instance_list = conn.describe_instances()
-            
+            self.dictionary[region_name].update(self.ec2_resources(region_name))
+
+    def ec2_resources(self, region_name):
+        instances = {}
+        conn = self.connect_service_region(
+            'ec2',
+            region_name=region_name
+        )
+        instance_pages = self.paginate(
+            conn, 'ec2', 'describe_instances', region_name
+        )
+        
+        for instance_list in instance_pages:
             for r in instance_list['Reservations']:
                 for i in r['Instances']:
                     instance_id = i['InstanceId']
@@ -142,85 +566,227 @@ class AWSAudit:
                     else:
                         key_name = ''
 
-                    self.dictionary[region_name]['EC2'][instance_id] = {
-                        'key_name': key_name,
-                        'launch_time': i['LaunchTime'],
-                        'instance_state': i['State']['Name'],
-                        'instance_type': i['InstanceType']
-                    }
+                    instances[instance_id] = InstanceRecord(
+                        key_name,
+                        i['LaunchTime'],
+                        i['State']['Name'],
+                        i['InstanceType']
+                    )
+        return {'EC2': instances}
 
     # Get Classic ELB
     def get_classic_elb_resources(self, regions):
         for region_name in regions:
-            conn = self.connect_service_region(
-                'elb',
-                region_name=region_name
-            )
-            lb = conn.describe_load_balancers()
+            self.dictionary[region_name].update(self.classic_elb_resources(region_name))
+
+    def classic_elb_resources(self, region_name):
+        load_balancers = {}
+        conn = self.connect_service_region(
+            'elb',
+            region_name=region_name
+        )
+        lb_pages = self.paginate(
+            conn, 'elb', 'describe_load_balancers', region_name
+        )
+        for lb in lb_pages:
             for l in lb['LoadBalancerDescriptions']:
-                self.dictionary[region_name]['ELB'][l['LoadBalancerName']] = {'instanceId': []}
+                load_balancers[l['LoadBalancerName']] = {'instanceId': []}
 
                 if l['Instances']:
-                    self.dictionary[region_name]['ELB'][l['LoadBalancerName']]['instanceId'] = [id for id in l['Instances']]
+                    load_balancers[l['LoadBalancerName']]['instanceId'] = [id for id in l['Instances']]
                 else:
-                    self.dictionary[region_name]['ELB'][l['LoadBalancerName']]['instanceId'] = []
+                    load_balancers[l['LoadBalancerName']]['instanceId'] = []
+        return {'ELB': load_balancers}
 
     # Get Network ELB
     def get_network_elb_resources(self, regions):
         for region_name in regions:
-            conn = self.connect_service_region(
-                'elbv2',
-                region_name=region_name
-            )
-            lb = conn.describe_load_balancers()
-            network_elb = len(lb['LoadBalancers'])
-            self.dictionary[region_name]['ELBV2'] = {
-                'Length': network_elb
-            }
+            self.dictionary[region_name].update(self.network_elb_resources(region_name))
+
+    def network_elb_resources(self, region_name):
+        conn = self.connect_service_region(
+            'elbv2',
+            region_name=region_name
+        )
+        lb_pages = self.paginate(
+            conn, 'elbv2', 'describe_load_balancers', region_name
+        )
+        network_elb = 0
+        names = []
+        for lb in lb_pages:
+            network_elb += len(lb['LoadBalancers'])
+            if self.database is not None:
+                names.extend(l['LoadBalancerName'] for l in lb['LoadBalancers'])
+        section = {'Length': network_elb}
+        if self.database is not None:
+            section['Names'] = names
+        return {'ELBV2': section}
 
     # Get Volumes and Snapshots
     def get_ebs_resources(self, regions):
-        sts_response = self.sts_client.get_caller_identity()
-        user_account = sts_response['Account']
-
+        self.identify()
         for region_name in regions: 
-            conn = self.connect_service_region(
-                'ec2',
-                region_name=region_name
-            )
+            self.dictionary[region_name].update(self.ebs_resources(region_name))
 
-            volumes = conn.describe_volumes()
-            snapshots = conn.describe_snapshots(
-                Filters=[
-                    {
-                        'Name': 'owner-id',
-                        'Values': [str(user_account)],
-                    }
-                ]
-            )
+    def ebs_resources(self, region_name):
+        volumes_dict = {}
+        # Volume index by attachment state, read by count_volume_types
+        volume_index = {'attached': set(), 'unattached': set()}
+        conn = self.connect_service_region(
+            'ec2',
+            region_name=region_name
+        )
 
+        volume_pages = self.paginate(
+            conn, 'ec2', 'describe_volumes', region_name
+        )
+        for volumes in volume_pages:
             for vol in volumes['Volumes']:
                 vol_id = vol['VolumeId']
-                self.dictionary[region_name]['EBS'][vol_id] = {
-                    'state': vol['State'],
-                    'snapshots': [],
-                    'size': vol['Size'],
-                    'volumeType': vol['VolumeType'],
-                }
-
-            # Get all snapshots and assign them to their volume
-            for snapshot in snapshots['Snapshots']:
-                snap = snapshot['VolumeId']
-                if (snap in self.dictionary[region_name]['EBS']):
-                    self.dictionary[region_name]['EBS'][snap]['snapshots'].append(snapshot['SnapshotId'])
+                attached = len(vol['Attachments']) > 0
+                volumes_dict[vol_id] = VolumeRecord(
+                    vol['State'],
+                    vol['Size'],
+                    vol['VolumeType'],
+                    attached
+                )
+                if attached:
+                    volume_index['attached'].add(vol_id)
                 else:
-                    self.dictionary[region_name]['EBS']['orphaned_snapshots'].append(snapshot['SnapshotId'])            
+                    volume_index['unattached'].add(vol_id)
+
+        # Get all snapshots and assign them to their volume. Aggregated in
+        # the same pass: volumes with snapshots, their total size and
+        # orphaned snapshots
+        snapshot_summary = {'attached': 0, 'orphaned': 0, 'size': 0}
+        # Every (snapshot id, volume id) is only kept for the database
+        snapshot_ids = [] if self.database is not None else None
+        for snapshot_id, volume_id in self.owned_snapshots(conn, region_name):
+            if snapshot_ids is not None:
+                snapshot_ids.append((snapshot_id, volume_id))
+            volume = volumes_dict.get(volume_id)
+            if volume is None:
+                snapshot_summary['orphaned'] += 1
+                continue
+            if volume.snapshot_count == 0:
+                snapshot_summary['attached'] += 1
+                snapshot_summary['size'] += volume.size
+            volume.snapshot_count += 1
+        sections = {
+            'EBS': volumes_dict,
+            'Volumes': volume_index,
+            'Snapshots': snapshot_summary
+        }
+        if snapshot_ids is not None:
+            sections['SnapshotIds'] = snapshot_ids
+        return sections
     
+    # (snapshot id, volume id) of every snapshot the account owns in a
+    # region, each snapshot once. With --incremental only snapshots
+    # started since the last run are described and merged into the saved
+    # ones.
+    def owned_snapshots(self, conn, region_name):
+        if self.state_store is not None:
+            return self.merged_snapshots(conn, region_name).items()
+        return (
+            (snapshot['SnapshotId'], snapshot['VolumeId'])
+            for snapshot in self.describe_snapshots(conn, region_name)
+        )
+
+    def describe_snapshots(self, conn, region_name, start_days=None):
+        filters = [
+            {
+                'Name': 'owner-id',
+                'Values': [str(self.user_account)],
+            }
+        ]
+        if start_days:
+            filters.append({'Name': 'start-time', 'Values': start_days})
+        snapshot_pages = self.paginate(
+            conn,
+            'ec2',
+            'describe_snapshots',
+            region_name,
+            Filters=filters
+        )
+        seen_snapshots = set()
+        for snapshots in snapshot_pages:
+            for snapshot in snapshots['Snapshots']:
+                if snapshot['SnapshotId'] in seen_snapshots:
+                    continue
+                seen_snapshots.add(snapshot['SnapshotId'])
+                yield snapshot
+
+    # Snapshots of the saved state plus those started since its
+    # watermark, or all of them when a full fetch is due
+    def merged_snapshots(self, conn, region_name):
+        previous = self.state_store.load(self.user_account, region_name)
+        now = datetime.now(timezone.utc)
+        start_days = None
+        if previous is not None and not previous.full_due(
+            self.args.full_every * 60 * 60, now.timestamp()
+        ):
+            start_days = previous.snapshot_days(now)
+
+        if start_days is None:
+            snapshots = {}
+            watermark = None
+            last_full = now.timestamp()
+        else:
+            snapshots = dict(previous.snapshots)
+            watermark = datetime.fromisoformat(previous.snapshot_watermark)
+            last_full = previous.last_full
+
+        for snapshot in self.describe_snapshots(conn, region_name, start_days):
+            snapshots[snapshot['SnapshotId']] = snapshot['VolumeId']
+            started = snapshot.get('StartTime')
+            if started is not None and (watermark is None or started > watermark):
+                watermark = started
+
+        self.snapshot_states[region_name] = (
+            previous,
+            snapshots,
+            watermark.isoformat() if watermark is not None else None,
+            last_full
+        )
+        return snapshots
+
+    # Save a region's inventory for the next --incremental run. Returns
+    # the changes since the previous run, or None on the first one.
+    def update_state(self, region_name):
+        previous, snapshots, watermark, last_full = self.snapshot_states.pop(region_name)
+        state = RegionState.from_resources(
+            self.dictionary[region_name], snapshots, watermark, last_full
+        )
+        self.state_store.save(self.user_account, region_name, state)
+        if previous is None:
+            return None
+        return state.changes(previous)
+
+    # Print what changed in a region since the previous run
+    def report_changes(self, region_name, changes):
+        if changes is None:
+            return
+        self.changes[region_name] = changes
+        if self.report_writer is not None:
+            self.report_writer.write_region(
+                change_rows(self.user_account, region_name, changes)
+            )
+            return
+        z = changes_table()
+        z.add_row([region_name, '', '', '', ''])
+        if not changes:
+            z.add_row(['', '', '', 'no changes', ''])
+        for service, resource, change, detail in changes:
+            z.add_row(['', service, resource, change, detail])
+        self.render(z, 'changes')
+
     # List EC2 instances                   
     def list_instances(self, state, region):
+        state_code = INSTANCE_STATE_CODES[state]
         instances_per_state = []
-        for i in self.dictionary[region]['EC2']:
-            if self.dictionary[region]['EC2'][i]['instance_state'] == state and i not in instances_per_state:
+        for i, instance in self.dictionary[region]['EC2'].items():
+            if instance.state_code == state_code:
                 instances_per_state.append(i)
                
         return(instances_per_state)
@@ -230,7 +796,7 @@ class AWSAudit:
         count_instance_type = {}
         for instance_id in instances_per_state:
             if instance_id in self.dictionary[region]['EC2']:
-                instance_type = self.dictionary[region]['EC2'][instance_id]['instance_type']
+                instance_type = self.dictionary[region]['EC2'][instance_id].instance_type
                 if instance_type not in count_instance_type:
                     count_instance_type[instance_type] = {'count': 1}
                 else:
@@ -247,651 +813,594 @@ class AWSAudit:
 
     # Count orphaned and attached snapshots      
     def count_snapshots(self, count_type, region):
-        attached_snapshot_count = 0
-        for vol_id in self.dictionary[region]['EBS']:
-            if vol_id == 'orphaned_snapshots':
-                continue
-            if vol_id in self.dictionary[region]['EBS']:
-                if len(self.dictionary[region]['EBS'][vol_id]['snapshots']) > 0:
-                    self.snap_vol_id.append(vol_id)
-                    attached_snapshot_count += 1   
-        
         if count_type == 'attached':
-            return attached_snapshot_count
+            return self.dictionary[region]['Snapshots']['attached']
         else:
-            orphaned_snapshot_count = len(self.dictionary[region]['EBS']['orphaned_snapshots'])
-            return orphaned_snapshot_count
+            return self.dictionary[region]['Snapshots']['orphaned']
    
-    # Count attached and orphaned volumes
-    def list_volumes(self, regions):
-        conn = self.connect_service_region(
-                'ec2',
-                region_name=regions
-            )
-        volumes = conn.describe_volumes()
-        for vol in volumes['Volumes']:
-            if len(vol['Attachments']) > 0:
-                if not vol['VolumeId'] in self.attached_vol_list:
-                    self.attached_vol_list.append(vol['VolumeId'])
-            else:
-                if not vol['VolumeId'] in self.unattached_vol_list:
-                    self.unattached_vol_list.append(vol['VolumeId'])
+    # Attached or orphaned volume ids, from the index built at discovery
+    def list_volumes(self, vol_list_type, region):
+        return self.dictionary[region]['Volumes'][vol_list_type]
     
     # Count volume types and repsective volume size
-    def count_volume_types(self, vol_list, vol_list_type, region):
+    def count_volume_types(self, vol_list_type, region):
         # Dictionary to store the count and size
         devices_dict = {}
+        volumes = self.dictionary[region]['EBS']
 
-        if vol_list_type == 'attached':
-            vol_list = self.attached_vol_list
-        else:
-            vol_list = self.unattached_vol_list
-        
-        for vol_id in vol_list:
-            if vol_id in self.dictionary[region]['EBS']:
-                v_type = self.dictionary[region]['EBS'][vol_id]['volumeType']
-                if v_type in devices_dict:
-                    devices_dict[v_type]['count'] += 1
-                    devices_dict[v_type]['size'] += self.dictionary[region]['EBS'][vol_id]['size']
+        for vol_id in self.list_volumes(vol_list_type, region):
+            v_type = volumes[vol_id].volume_type
+            if v_type in devices_dict:
+                devices_dict[v_type]['count'] += 1
+                devices_dict[v_type]['size'] += volumes[vol_id].size
 
-                else:
-                    devices_dict[v_type] = {
-                        'count': 1,
-                        'size': 1,
-                    }
+            else:
+                devices_dict[v_type] = {
+                    'count': 1,
+                    'size': volumes[vol_id].size,
+                }
         
         self.volume_ebs[region] = devices_dict
         return self.volume_ebs[region]
    
+    # Total size of the volumes that have snapshots
+    def snapshot_size(self, region):
+        return self.dictionary[region]['Snapshots']['size']
+
+    # Usage of every priced service in a region, costed by the engine, or
+    # by SQL joins over the inventory and prices stored with --sqlite
+    def region_costs(self, region, engine):
+        if self.database is not None:
+            return self.database.region_costs(self.audit_id, region)
+        count_of_instances = self.count_instance_types(self.list_instances(self.state, region), region)
+        classic_elb_instances = self.count_classic_elb(region)
+        network_elb_instances = self.count_network_elb(region)
+        attached_vol_dict = self.count_volume_types('attached', region)
+        unattached_vol_dict = self.count_volume_types('unattached', region)
+        attached_snap = self.count_snapshots('attached', region)
+        orphaned_snap = self.count_snapshots('unattached', region)
+
+        return {
+            'EC2': engine.service_cost(region, 'EC2', [
+                (i_type, i_type, count['count'], count['count'])
+                for i_type, count in count_of_instances.items()
+            ]),
+            'ELB': engine.service_cost(region, 'ELB', [
+                ('', None, classic_elb_instances, classic_elb_instances)
+            ]),
+            'ELBV2': engine.service_cost(region, 'ELBV2', [
+                ('', None, network_elb_instances, network_elb_instances)
+            ]),
+            'Attached Volume': engine.service_cost(region, 'EBS', [
+                (v_type, v_type, volume['count'], volume['size'])
+                for v_type, volume in attached_vol_dict.items()
+            ]),
+            'Orphaned Volume': engine.service_cost(region, 'EBS', [
+                (v_type, v_type, volume['count'], volume['size'])
+                for v_type, volume in unattached_vol_dict.items()
+            ]),
+            'Snapshots': engine.service_cost(region, 'Snapshots', [
+                ('snapshots', None, attached_snap, self.snapshot_size(region)),
+                ('orphaned snapshots', None, orphaned_snap, orphaned_snap)
+            ]),
+        }
+
+    # Cost engine over the prices of the audited regions, pushed down to
+    # the pricing API when there is only one, or over the prices of the
+    # pricing daemon with --price-source daemon. refresh bypasses the
+    # pricing cache like --refresh-pricing.
+    def price_engine(self, regions, refresh=False):
+        if self.args.price_source == 'daemon':
+            return self.daemon_price_engine()
+        cache = PricingCache(
+            self.args.cache_dir,
+            ttl=self.args.cache_ttl * 60 * 60,
+            max_size=self.args.cache_max_size * 1024 * 1024
+        )
+        if self.args.clear_cache:
+            cache.clear()
+        p_info = pricing_info(
+            cache=cache,
+            refresh=self.args.refresh_pricing or refresh,
+            offline=self.args.offline,
+            clients=self.clients,
+            region=regions[0] if len(regions) == 1 else None,
+            profiler=self.profiler
+        )
+        with self.profiler.phase('pricing'):
+            if self.args.offer_file:
+                p_info.load_offer_file(self.args.offer_file)
+            else:
+                p_info.price_lists(workers=self.args.pricing_workers)
+            engine = CostEngine(p_info.price_index(), self.per_month_hours)
+        if self.database is not None:
+            with self.profiler.phase('store', report='pricing'):
+                self.database.add_prices(self.audit_id, engine.price_index)
+        return engine
+
+    # Prices looked up in a running pricing daemon, checked to answer
+    # before the audit relies on it
+    def daemon_price_engine(self):
+        from aws_audit.price_client import RemotePriceIndex
+
+        price_index = RemotePriceIndex(self.args.daemon_url)
+        with self.profiler.phase('pricing'):
+            price_index.health()
+        engine = CostEngine(price_index, self.per_month_hours)
+        if self.database is not None:
+            with self.profiler.phase('store', report='pricing'):
+                self.database.add_prices(self.audit_id, price_index)
+        return engine
+
     # Get monthly estimated cost for AWS resources
     def get_price(
         self,
         regions,
         volume
-    ):        
-        p_info = pricing_info()
-        elbv2 = p_info.price_list_ELBV2()
-        elb = p_info.price_list_ELB()
-        vol_pricing = p_info.price_list_EBS()
-        pricing_json = p_info.price_list_EC2()
-        snapshot_pricing = p_info.price_list_snapshots()
-
-        # Pricing
+    ):
+        x = pricing_table()
+        engine = self.price_engine(regions)
+        with self.profiler.phase('report', report='pricing'):
+            for region in regions:
+                self.add_price_rows(x, region, engine)
+        self.render(x, 'pricing')
+        return x
+
+    # Print a report table, timed on its own as rendering large tables is
+    # not free
+    def render(self, table, report):
+        with self.profiler.phase('render', report=report):
+            print(table, file=self.output)
+
+    # Stream the rows of each region to the report writer as soon as they
+    # are computed
+    def write_reports(self, regions):
+        engine = None
+        if self.args.pricing:
+            engine = self.price_engine(regions)
         for region in regions:
-            x.add_row(
-                [
-                    region,
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            total_instances = 0
-            total_size = 0
-            price_per_month = 0
-            price = 0
-            total_cost = 0.00
-            unattached_volume_cost = 0.00
-            attached_volume_cost = 0.00
-            unattached_length = 0
-            attached_length = 0
+            self.report_writer.write_region(self.report_rows(region, engine))
+
+    # Report rows of one region, with pricing rows when an engine is given
+    def report_rows(self, region, engine=None):
+        rows = []
+        if self.args.resources:
+            with self.profiler.phase('report', report='resources'):
+                rows.extend(self.resource_rows(region))
+        if engine is not None:
+            with self.profiler.phase('report', report='pricing'):
+                rows.extend(cost_rows(
+                    self.user_account, region, self.region_costs(region, engine)
+                ))
+        return rows
+
+    # Resource counts of one region, the rows of the resources table
+    def resource_rows(self, region):
+        account = self.user_account
+        rows = [
+            ReportRow(account, region, 'resources', 'EC2', i_type, count['count'], count['count'])
+            for i_type, count in self.count_instance_types(
+                self.list_instances(self.state, region), region
+            ).items()
+        ]
+        classic_elb_instances = self.count_classic_elb(region)
+        network_elb_instances = self.count_network_elb(region)
+        rows.append(ReportRow(
+            account, region, 'resources', 'ELB', '', classic_elb_instances, classic_elb_instances
+        ))
+        rows.append(ReportRow(
+            account, region, 'resources', 'ELBV2', '', network_elb_instances, network_elb_instances
+        ))
+        for service, vol_list_type in [
+            ('Attached Volume', 'attached'),
+            ('Orphaned Volume', 'unattached')
+        ]:
+            for v_type, volume in self.count_volume_types(vol_list_type, region).items():
+                rows.append(ReportRow(
+                    account, region, 'resources', service, v_type, volume['count'], volume['size']
+                ))
+        orphaned_snap = self.count_snapshots('unattached', region)
+        rows.append(ReportRow(
+            account,
+            region,
+            'resources',
+            'Snapshots',
+            'snapshots',
+            self.count_snapshots('attached', region),
+            self.snapshot_size(region)
+        ))
+        rows.append(ReportRow(
+            account, region, 'resources', 'Snapshots', 'orphaned snapshots', orphaned_snap, orphaned_snap
+        ))
+        return rows
+
+    # Pricing rows of one region, costs are only rounded when they are
+    # added to the table
+    def add_price_rows(self, x, region, engine):
+        costs = self.region_costs(region, engine)
+        x.add_row([region, '', '', '', '', '', ''])
 
         # EC2 pricing
+        x.add_row(['', 'EC2 Instances', '', '', '', '', ''])
+        ec2 = costs['EC2']
+        for i_type, count, _, price, _ in ec2.lines():
             x.add_row(
                 [
-                    '',
-                    'EC2 Instances',
-                    '',
                     '',
                     '',
+                    i_type,
+                    count,
+                    price_cell(price, 3),
                     '',
                     '',
                 ]
             )
-            count_of_instances = self.count_instance_types(self.list_instances(self.state, region), region)
-            for i_type in count_of_instances:
-                if i_type in (instance_type for instance_type in pricing_json[region]['EC2']):
-                    price = round(float(pricing_json[region]['EC2'][i_type]['OnDemand']['USD']),3)
-                    total_cost = round(float(total_cost + (price * count_of_instances[i_type]['count'])), 3)
-                    total_instances += count_of_instances[i_type]['count']
+        x.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                '',
+                ec2.total_count,
+                round(ec2.total_cost, 3),
+            ]
+        )
 
+        # Classic and Network ELB pricing
+        for service, title in [('ELB', 'ELB Classic'), ('ELBV2', 'ELB Network')]:
+            x.add_row(['', title, '', '', '', '', ''])
+            for _, count, _, price, cost in costs[service].lines():
                 x.add_row(
                     [
                         '',
                         '',
-                        i_type,
-                        count_of_instances[i_type]['count'],
-                        price,
                         '',
                         '',
+                        price_cell(price),
+                        count,
+                        round(cost, 3),
                     ]
                 )
 
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    total_instances,
-                    round((total_cost * self.per_month_hours),3),
-                ]
-            )
-            
-        # Classic ELB pricing
-            x.add_row(
-                [
-                    '',
-                    'ELB Classic',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            
-            classic_elb_instances = self.count_classic_elb(region)
-            price = float(elb[region]['ELB']['OnDemand']['USD'])
-            total_cost = round(float(price * classic_elb_instances * self.per_month_hours),3)
-
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    price,
-                    classic_elb_instances,
-                    total_cost,
-                ]
-            )
-
-        # Network ELB pricing
-            x.add_row(
-                [
-                    '',
-                    'ELB Network',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            network_elb_instances = self.count_network_elb(region)
-            price = float(elbv2[region]['ELBV2']['OnDemand']['USD'])
-            total_cost = round(
-                float(price * network_elb_instances * self.per_month_hours),
-                3,
-            )
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    price,
-                    network_elb_instances,
-                    total_cost,
-                ]
-            )
-
         # Volume pricing
-            x.add_row(
-                [
-                    '',
-                    'Volume',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            x.add_row(
-                [
-                    '',
-                    '',
-                    'Attached Volume',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            attached_vol_dict = self.count_volume_types(
-                self.list_volumes(region),
-                'attached',
-                region
-                )
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            for volume_type in attached_vol_dict:
-                if volume_type in (v_type for v_type in vol_pricing[region]['EBS']):
-                    attached_length += attached_vol_dict[volume_type]['count']
-                    price = float(vol_pricing[region]['EBS'][volume_type]['OnDemand']['USD'])
-                    attached_volume_cost = round(
-                        float(float(attached_vol_dict[volume_type]['size'])
-                        * price 
-                        + attached_volume_cost), 3)
-                    x.add_row(
-                        [
-                            '',
-                            '',
-                            volume_type,
-                            attached_vol_dict[volume_type]['count'],
-                            price,
-                            attached_vol_dict[volume_type]['size'],
-                            '',
-                        ]
-                    )
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    'Total Attached Volumes',
-                    attached_length,
-                    attached_volume_cost,
-                ]
-            )
-            
-            x.add_row(
-                [
-                    '',
-                    '',
-                    'Orphaned Volume',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            unattached_vol_dict = self.count_volume_types(
-                self.list_volumes(region),
-                'unattached',
-                region
-                )
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            for volume_type in unattached_vol_dict:
-                if volume_type in (v_type for v_type in vol_pricing[region]['EBS']):
-                    unattached_length += unattached_vol_dict[volume_type]['count']
-                    price = float(vol_pricing[region]['EBS'][volume_type]['OnDemand']['USD'])
-                    unattached_volume_cost = round(
-                        float(float(unattached_vol_dict[volume_type]['size'])
-                        * price 
-                        + unattached_volume_cost), 3)
-                    x.add_row(
-                        [
-                            '',
-                            '',
-                            volume_type,
-                            unattached_vol_dict[volume_type]['count'],
-                            price,
-                            unattached_vol_dict[volume_type]['size'],
-                            '',
-                        ]
-                    )
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    'Total Orphaned Volumes',
-                    unattached_length,
-                    unattached_volume_cost,
-                ]
-            )
-            
-            # Snapshot pricing
-            x.add_row(
-                [
-                    '',
-                    'Snapshots',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            x.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            attached_snap = self.count_snapshots('attached', region) 
-            price = float(snapshot_pricing[region]['Snapshots']['OnDemand']['USD'])
-            for volume_id in self.snap_vol_id:
-                if volume_id in (vol_id for vol_id in self.dictionary[region]['EBS']):
-                    size = self.dictionary[region]['EBS'][volume_id]['size']
-                    total_size += size
-                price_per_month = round(
-                    float(price 
-                    * float(total_size)), 3
+        x.add_row(['', 'Volume', '', '', '', '', ''])
+        for title, total_title in [
+            ('Attached Volume', 'Total Attached Volumes'),
+            ('Orphaned Volume', 'Total Orphaned Volumes')
+        ]:
+            volumes = costs[title]
+            x.add_row(['', '', title, '', '', '', ''])
+            x.add_row(['', '', '', '', '', '', ''])
+            for volume_type, count, size, price, _ in volumes.lines():
+                if price is None:
+                    continue
+                x.add_row(
+                    [
+                        '',
+                        '',
+                        volume_type,
+                        count,
+                        price,
+                        size,
+                        '',
+                    ]
                 )
             x.add_row(
                 [
                     '',
                     '',
-                    'snapshots',
-                    attached_snap,
-                    price,
-                    total_size,
-                    price_per_month,
-                ]
-            )
-            orphaned_snap = self.count_snapshots('unattached', region) 
-            x.add_row(
-                [
                     '',
                     '',
-                    'orphaned snapshots',
-                    orphaned_snap,
-                    price,
-                    '',
-                    round(
-                        float(price
-                            * orphaned_snap), 3)
+                    total_title,
+                    volumes.total_count,
+                    round(volumes.total_cost, 3),
                 ]
             )
+        
+        # Snapshot pricing
+        x.add_row(['', 'Snapshots', '', '', '', '', ''])
+        x.add_row(['', '', '', '', '', '', ''])
+        attached, orphaned = costs['Snapshots'].lines()
+        x.add_row(
+            [
+                '',
+                '',
+                attached[0],
+                attached[1],
+                price_cell(attached[3]),
+                attached[2],
+                round(attached[4], 3),
+            ]
+        )
+        x.add_row(
+            [
+                '',
+                '',
+                orphaned[0],
+                orphaned[1],
+                price_cell(orphaned[3]),
+                '',
+                round(orphaned[4], 3),
+            ]
+        )
 
-        print(x)
-    
-    # Get monthly estimated cost for AWS resources
+    # Get AWS resources report
     def get_resources(
         self,
         regions,
         volume
-    ):  
-        for region in regions:
-            y.add_row(
-                [
-                    region,
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            total_instances = 0
-            size = 0
-            unattached_length = 0
-            attached_length = 0
+    ):
+        y = resources_table()
+        with self.profiler.phase('report', report='resources'):
+            for region in regions:
+                self.add_resource_rows(y, region)
+        self.render(y, 'resources')
+        return y
 
-        # EC2 pricing
-            y.add_row(
-                [
-                    '',
-                    'EC2 Instances',
-                    '',
-                    '',
-                    '',
-                    '',
-                ]
-            )
-            count_of_instances = self.count_instance_types(self.list_instances(self.state, region), region)
-            for i_type in count_of_instances:
-                total_instances += count_of_instances[i_type]['count']
+    # Resource rows of one region
+    def add_resource_rows(self, y, region):
+        y.add_row(
+            [
+                region,
+                '',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        total_instances = 0
+        unattached_length = 0
+        attached_length = 0
 
-                y.add_row(
-                    [
-                        '',
-                        '',
-                        i_type,
-                        count_of_instances[i_type]['count'],
-                        '',
-                        '',
-                    ]
-                )
+        # EC2 pricing
+        y.add_row(
+            [
+                '',
+                'EC2 Instances',
+                '',
+                '',
+                '',
+                '',
+            ]
+        )
+        count_of_instances = self.count_instance_types(self.list_instances(self.state, region), region)
+        for i_type in count_of_instances:
+            total_instances += count_of_instances[i_type]['count']
 
             y.add_row(
                 [
                     '',
                     '',
+                    i_type,
+                    count_of_instances[i_type]['count'],
                     '',
                     '',
-                    '',
-                    total_instances,
                 ]
             )
-            
+
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                '',
+                total_instances,
+            ]
+        )
+        
         # Classic ELB pricing
-            y.add_row(
-                [
-                    '',
-                    'ELB Classic',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            
-            classic_elb_instances = self.count_classic_elb(region)
-            y.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    classic_elb_instances,
-                ]
-            )
+        y.add_row(
+            [
+                '',
+                'ELB Classic',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        
+        classic_elb_instances = self.count_classic_elb(region)
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                '',
+                classic_elb_instances,
+            ]
+        )
 
         # Network ELB pricing
-            y.add_row(
-                [
-                    '',
-                    'ELB Network',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            network_elb_instances = self.count_network_elb(region)
-            y.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    network_elb_instances
-                ]
-            )
+        y.add_row(
+            [
+                '',
+                'ELB Network',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        network_elb_instances = self.count_network_elb(region)
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                '',
+                network_elb_instances
+            ]
+        )
 
         # Volume pricing
+        y.add_row(
+            [
+                '',
+                'Volume',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        y.add_row(
+            [
+                '',
+                '',
+                'Attached Volume',
+                '',
+                '',
+                ''
+            ]
+        )
+        attached_vol_dict = self.count_volume_types('attached', region)
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        for volume_type in attached_vol_dict:
+            attached_length += attached_vol_dict[volume_type]['count']
             y.add_row(
                 [
-                    '',
-                    'Volume',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            y.add_row(
-                [
-                    '',
-                    '',
-                    'Attached Volume',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            attached_vol_dict = self.count_volume_types(
-                self.list_volumes(region),
-                'attached',
-                region
-                )
-            y.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            for volume_type in attached_vol_dict:
-                attached_length += attached_vol_dict[volume_type]['count']
-                y.add_row(
-                    [
-                        '',
-                        '',
-                        volume_type,
-                        attached_vol_dict[volume_type]['count'],
-                        '',
-                        attached_vol_dict[volume_type]['size']
-                    ]
-                )
-            y.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    'Total Attached Volumes',
-                    attached_length
-                ]
-            )
-            
-            y.add_row(
-                [
-                    '',
-                    '',
-                    'Orphaned Volume',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            unattached_vol_dict = self.count_volume_types(
-                self.list_volumes(region),
-                'unattached',
-                region
-                )
-            y.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            for volume_type in unattached_vol_dict:
-                unattached_length += unattached_vol_dict[volume_type]['count']
-                
-                y.add_row(
-                    [
-                        '',
-                        '',
-                        volume_type,
-                        unattached_vol_dict[volume_type]['count'],
-                        '',
-                        unattached_vol_dict[volume_type]['size']
-                    ]
-                )
-            y.add_row(
-                [
-                    '',
                     '',
                     '',
+                    volume_type,
+                    attached_vol_dict[volume_type]['count'],
                     '',
-                    'Total Orphaned Volumes',
-                    unattached_length
+                    attached_vol_dict[volume_type]['size']
                 ]
             )
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                'Total Attached Volumes',
+                attached_length
+            ]
+        )
+        
+        y.add_row(
+            [
+                '',
+                '',
+                'Orphaned Volume',
+                '',
+                '',
+                ''
+            ]
+        )
+        unattached_vol_dict = self.count_volume_types('unattached', region)
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        for volume_type in unattached_vol_dict:
+            unattached_length += unattached_vol_dict[volume_type]['count']
             
-            # Snapshot pricing
             y.add_row(
                 [
-                    '',
-                    'Snapshots',
                     '',
                     '',
+                    volume_type,
+                    unattached_vol_dict[volume_type]['count'],
                     '',
-                    ''
+                    unattached_vol_dict[volume_type]['size']
                 ]
             )
-            y.add_row(
-                [
-                    '',
-                    '',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-            )
-            attached_snap = self.count_snapshots('attached', region)
-            for volume_id in self.snap_vol_id:
-                if volume_id in (vol_id for vol_id in self.dictionary[region]['EBS']):
-                    size += self.dictionary[region]['EBS'][volume_id]['size']
-            y.add_row(
-                [
-                    '',
-                    '',
-                    'snapshots',
-                    attached_snap,
-                    '',
-                    size
-                ]
-            )
-            orphaned_snap = self.count_snapshots('unattached', region) 
-            y.add_row(
-                [
-                    '',
-                    '',
-                    'orphaned snapshots',
-                    orphaned_snap,
-                    '',
-                    ''
-                ]
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                'Total Orphaned Volumes',
+                unattached_length
+            ]
+        )
+        
+        # Snapshot pricing
+        y.add_row(
+            [
+                '',
+                'Snapshots',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        y.add_row(
+            [
+                '',
+                '',
+                '',
+                '',
+                '',
+                ''
+            ]
+        )
+        attached_snap = self.count_snapshots('attached', region)
+        size = self.snapshot_size(region)
+        y.add_row(
+            [
+                '',
+                '',
+                'snapshots',
+                attached_snap,
+                '',
+                size
+            ]
+        )
+        orphaned_snap = self.count_snapshots('unattached', region) 
+        y.add_row(
+            [
+                '',
+                '',
+                'orphaned snapshots',
+                orphaned_snap,
+                '',
+                ''
+            ]
+        )
+
+
+# With --offline and no cached prices the audit stops with the message
+# rather than a traceback
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.accounts:
+            from aws_audit.accounts import (
+                MultiAccountAudit,
+                read_accounts
             )
 
-        print(y)
+            MultiAccountAudit(args, read_accounts(args.accounts, args.role_name)).run()
+        else:
+            AWSAudit(args).run()
+    except PricingCacheMiss as e:
+        sys.exit('aws-audit: error: {}'.format(e))
 
 
-aws_audit = AWSAudit()
+if __name__ == '__main__':
+    main()
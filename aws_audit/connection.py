@@ -1,8 +1,175 @@
-import boto3 
-import sys
+import threading
+
+# The pricing API is only served from a few regions
+PRICING_REGION = 'us-east-1'
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+# botocore retry mode and attempts per call, first one included. Throttled
+# attempts are also spaced out by rate_limit.AdaptiveRateLimiter.
+RETRY_MODES = ('standard', 'adaptive', 'legacy')
+DEFAULT_RETRY_MODE = 'standard'
+DEFAULT_MAX_ATTEMPTS = 8
+
+# One client per (service, region), all built from a single session so
+# endpoint resolution, credentials and connection pools are shared by
+# every collector and by pricing_info. boto3 is only imported when the
+# first client is requested.
+class ClientRegistry:
+    def __init__(
+        self,
+        session=None,
+        max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        retry_mode=DEFAULT_RETRY_MODE,
+        max_attempts=DEFAULT_MAX_ATTEMPTS
+    ):
+        self.session = session
+        self.clients = {}
+        self.handlers = []
+        self.lock = threading.Lock()
+        # Rate limiter shared by every client, see shared_rate_limiter
+        self.rate_limiter = None
+        self.rate_limiter_lock = threading.Lock()
+        self.configure(max_pool_connections, tcp_keepalive, retry_mode, max_attempts)
+
+    # Settings only apply to clients created afterwards
+    def configure(
+        self,
+        max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        retry_mode=DEFAULT_RETRY_MODE,
+        max_attempts=DEFAULT_MAX_ATTEMPTS
+    ):
+        self.config_options = {
+            'max_pool_connections': max_pool_connections,
+            'tcp_keepalive': tcp_keepalive,
+            'retries': {
+                'mode': retry_mode,
+                'total_max_attempts': max_attempts
+            }
+        }
+
+    def client(self, service, region_name=None):
+        key = (service, region_name)
+        client = self.clients.get(key)
+        if client is not None:
+            return client
+
+        # boto3 sessions are not safe to build clients from concurrently
+        with self.lock:
+            if key not in self.clients:
+                from botocore.config import Config
+
+                if self.session is None:
+                    import boto3
+
+                    self.session = boto3.Session()
+                client = self.session.client(
+                    service,
+                    region_name=region_name,
+                    config=Config(**self.config_options)
+                )
+                for registration in self.handlers:
+                    self.register_handler(client, service, registration)
+                self.clients[key] = client
+            return self.clients[key]
+
+    # Register handler(service, region_name, **kwargs) for a botocore
+    # event on every client, those already created and those created
+    # afterwards. Returns the registration to pass to unregister.
+    def register(self, event_name, handler, first=False):
+        registration = (event_name, handler, first)
+        with self.lock:
+            self.handlers.append(registration)
+            for (service, _), client in self.clients.items():
+                self.register_handler(client, service, registration)
+        return registration
+
+    def unregister(self, registration):
+        with self.lock:
+            self.handlers.remove(registration)
+            for client in self.clients.values():
+                client.meta.events.unregister(
+                    registration[0], unique_id=self.handler_id(registration)
+                )
+
+    @staticmethod
+    def handler_id(registration):
+        return 'aws_audit-{}'.format(id(registration))
+
+    @classmethod
+    def register_handler(cls, client, service, registration):
+        event_name, handler, first = registration
+        region_name = client.meta.region_name
+
+        def emitted(**kwargs):
+            return handler(service, region_name, **kwargs)
+
+        if first:
+            register = client.meta.events.register_first
+        else:
+            register = client.meta.events.register
+        register(event_name, emitted, unique_id=cls.handler_id(registration))
+
+    # The rate limiter of this registry, created with create(registry)
+    # and attached by the first caller only, so audits sharing a registry
+    # also share its buckets
+    def shared_rate_limiter(self, create):
+        with self.rate_limiter_lock:
+            if self.rate_limiter is None:
+                self.rate_limiter = create(self)
+            return self.rate_limiter
+
+    def pricing_client(self):
+        return self.client('pricing', PRICING_REGION)
+
+    # Registry for another account, with the client settings of this one
+    # and credentials of role_arn assumed with this registry's session.
+    # The credentials are refreshed by botocore before they expire, so
+    # audits can run longer than the role's session. Event handlers are
+    # not copied, the caller registers its own on the new registry.
+    def assume_role(self, role_arn, session_name, external_id=None):
+        import boto3
+        import botocore.session
+        from botocore.credentials import (
+            AssumeRoleCredentialFetcher,
+            CredentialProvider,
+            RefreshableCredentials
+        )
+
+        # Creates this registry's session
+        self.client('sts')
+        extra_args = {'RoleSessionName': session_name}
+        if external_id:
+            extra_args['ExternalId'] = external_id
+        fetcher = AssumeRoleCredentialFetcher(
+            self.session.client,
+            self.session.get_credentials(),
+            role_arn,
+            extra_args=extra_args
+        )
+        credentials = RefreshableCredentials.create_from_metadata(
+            fetcher.fetch_credentials(),
+            refresh_using=fetcher.fetch_credentials,
+            method='assume-role'
+        )
+
+        class AssumedRoleProvider(CredentialProvider):
+            METHOD = 'assume-role'
+
+            def load(self):
+                return credentials
+
+        botocore_session = botocore.session.Session()
+        botocore_session.get_component('credential_provider').insert_before(
+            'env', AssumedRoleProvider()
+        )
+        clients = ClientRegistry(session=boto3.Session(
+            botocore_session=botocore_session,
+            region_name=self.session.region_name
+        ))
+        clients.config_options = dict(self.config_options)
+        return clients
+
 
 #Connection to the API endpoints
-region = boto3.Session(region_name='us-east-1')
-session = boto3.Session(region_name='eu-west-2')
-ec2 = session.client('ec2')
-pricing_client = region.client('pricing')
+registry = ClientRegistry()
@@ -25,4 +25,8 @@ region_short_names = {
 }
 
 #List of keys in the dict region_short_names
-aws_region = list(region_short_names.values())
\ No newline at end of file
+aws_region = list(region_short_names.values())
+# Where the pricing daemon listens by default, see price_daemon.py
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 8765
+DEFAULT_DAEMON_URL = 'http://{}:{}'.format(DAEMON_HOST, DAEMON_PORT)
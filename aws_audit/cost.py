@@ -0,0 +1,63 @@
+import math
+
+# Monthly cost computation for one region. Usage is collected into
+# columns (types, counts, quantities), prices for a whole column come
+# from one PriceIndex.lookup_many call and every service total is a
+# single sum over those columns. Nothing is rounded here, rounding is
+# left to the report.
+
+# Services priced per hour, the others are priced per GB-month
+HOURLY_SERVICES = ('EC2', 'ELB', 'ELBV2')
+
+
+class ServiceCost:
+    __slots__ = ('labels', 'counts', 'quantities', 'prices', 'costs')
+
+    def __init__(self, labels, counts, quantities, prices, costs):
+        self.labels = labels
+        self.counts = counts
+        self.quantities = quantities
+        self.prices = prices
+        self.costs = costs
+
+    # Rows as (label, count, quantity, price, cost), price is None when
+    # the price list has no entry for the row
+    def lines(self):
+        return list(zip(self.labels, self.counts, self.quantities, self.prices, self.costs))
+
+    @property
+    def total_count(self):
+        return sum(count for count, price in zip(self.counts, self.prices) if price is not None)
+
+    @property
+    def total_cost(self):
+        return math.fsum(self.costs)
+
+
+class CostEngine:
+    def __init__(self, price_index, per_month_hours=730.5):
+        self.price_index = price_index
+        self.per_month_hours = per_month_hours
+
+    # Cost of one service in a region. usage is a list of
+    # (label, price type, count, quantity) tuples where quantity is the
+    # number of hourly units or of GB billed for that row. Rows the price
+    # index has no on-demand price for get a price of None.
+    def service_cost(self, region, service, usage):
+        if not usage:
+            return ServiceCost((), (), (), (), ())
+
+        labels, resource_types, counts, quantities = zip(*usage)
+        prices = self.price_index.lookup_many(
+            [
+                (region, service, resource_type, 'OnDemand', None)
+                for resource_type in resource_types
+            ],
+            default=None
+        )
+        multiplier = self.per_month_hours if service in HOURLY_SERVICES else 1
+        costs = [
+            quantity * price * multiplier if price is not None else 0.0
+            for quantity, price in zip(quantities, prices)
+        ]
+        return ServiceCost(labels, counts, quantities, prices, costs)
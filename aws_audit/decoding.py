@@ -0,0 +1,44 @@
+import json
+
+# Decoding of GetProducts PriceList items. Items are rejected as cheaply
+# as possible: a substring check for keys (attribute names, term types)
+# the family requires comes first, then the items left are decoded, with
+# orjson when it is installed (the fast-json extra) and the stdlib json
+# module otherwise, and tested with an optional predicate over their
+# product attributes. Decoding only the "product" object first doesn't
+# pay off with either backend: json's raw_decode of it costs about as
+# much as orjson decoding the whole item.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+else:
+    loads = json.loads
+
+product_decoder = json.JSONDecoder()
+PRODUCT_KEY = '"product"'
+
+
+# The "product" object of a raw item, decoded without touching "terms",
+# for filters over raw items that are kept as they are
+def decode_product(raw):
+    start = raw.find(PRODUCT_KEY)
+    if start == -1:
+        return loads(raw).get('product', {})
+    start = raw.find('{', start + len(PRODUCT_KEY))
+    product, _ = product_decoder.raw_decode(raw, start)
+    return product
+
+
+def decode_items(price_list, required_keys=(), accept=None):
+    needles = ['"{}"'.format(key) for key in required_keys]
+    for raw in price_list:
+        if needles and not all(needle in raw for needle in needles):
+            continue
+        item = loads(raw)
+        if accept is None or accept(item.get('product', {}).get('attributes', {})):
+            yield item
@@ -0,0 +1,56 @@
+import sys
+
+# Compact records for the audit inventory. A region can hold hundreds of
+# thousands of instances and volumes, so records use __slots__, repeated
+# strings (types, key names) are interned and states are stored as small
+# integer codes instead of strings.
+
+INSTANCE_STATES = (
+    'pending',
+    'running',
+    'shutting-down',
+    'terminated',
+    'stopping',
+    'stopped'
+)
+INSTANCE_STATE_CODES = {state: code for code, state in enumerate(INSTANCE_STATES)}
+
+VOLUME_STATES = (
+    'creating',
+    'available',
+    'in-use',
+    'deleting',
+    'deleted',
+    'error'
+)
+VOLUME_STATE_CODES = {state: code for code, state in enumerate(VOLUME_STATES)}
+
+
+class InstanceRecord:
+    __slots__ = ('key_name', 'launch_time', 'state_code', 'instance_type')
+
+    def __init__(self, key_name, launch_time, instance_state, instance_type):
+        self.key_name = sys.intern(key_name)
+        # Seconds since the epoch, a float is a third of a datetime
+        self.launch_time = launch_time.timestamp()
+        self.state_code = INSTANCE_STATE_CODES[instance_state]
+        self.instance_type = sys.intern(instance_type)
+
+    @property
+    def instance_state(self):
+        return INSTANCE_STATES[self.state_code]
+
+
+class VolumeRecord:
+    __slots__ = ('state_code', 'size', 'volume_type', 'attached', 'snapshot_count')
+
+    def __init__(self, state, size, volume_type, attached):
+        self.state_code = VOLUME_STATE_CODES[state]
+        self.size = size
+        self.volume_type = sys.intern(volume_type)
+        self.attached = attached
+        self.snapshot_count = 0
+
+    @property
+    def state(self):
+        return VOLUME_STATES[self.state_code]
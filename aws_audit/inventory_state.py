@@ -0,0 +1,182 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from aws_audit.atomic_file import atomic_write
+
+# Inventory saved between runs for incremental audits, one JSON file per
+# (account, region). Snapshots are the only resources the EC2 API can
+# list by creation date, so they are the part fetched incrementally: a
+# run only asks for snapshots started since the newest one already known
+# and merges them into the saved set. Instances, volumes and load
+# balancers change state in place, so they are still described in full;
+# what is saved of them is just enough to report what changed.
+#
+# Snapshot deletions can't be seen in a delta, so every full_every
+# seconds (and whenever the gap since the last run is too long to bridge
+# with start-time filters) snapshots are fetched in full again.
+
+DEFAULT_STATE_DIR = os.path.join(
+    os.environ.get('XDG_STATE_HOME', os.path.expanduser('~/.local/state')),
+    'aws_audit',
+    'inventory'
+)
+DEFAULT_FULL_EVERY = 24 * 60 * 60
+# Longest gap bridged with per-day start-time filter values
+MAX_DELTA_DAYS = 31
+STATE_VERSION = 1
+STATE_SUFFIX = '.json'
+
+
+class RegionState:
+    __slots__ = (
+        'instances',
+        'volumes',
+        'snapshots',
+        'classic_elb',
+        'network_elb',
+        'snapshot_watermark',
+        'last_full',
+        'saved'
+    )
+
+    def __init__(
+        self,
+        instances=None,
+        volumes=None,
+        snapshots=None,
+        classic_elb=None,
+        network_elb=0,
+        snapshot_watermark=None,
+        last_full=0,
+        saved=0
+    ):
+        # {instance id: [state, type]}
+        self.instances = instances if instances is not None else {}
+        # {volume id: [state, size, type, attached]}
+        self.volumes = volumes if volumes is not None else {}
+        # {snapshot id: volume id}
+        self.snapshots = snapshots if snapshots is not None else {}
+        # {load balancer name: [instance ids]}
+        self.classic_elb = classic_elb if classic_elb is not None else {}
+        self.network_elb = network_elb
+        # StartTime of the newest snapshot seen, ISO 8601
+        self.snapshot_watermark = snapshot_watermark
+        self.last_full = last_full
+        self.saved = saved
+
+    # State of one region of AWSAudit.dictionary
+    @classmethod
+    def from_resources(cls, resources, snapshots, snapshot_watermark, last_full):
+        return cls(
+            instances={
+                instance_id: [instance.instance_state, instance.instance_type]
+                for instance_id, instance in resources['EC2'].items()
+            },
+            volumes={
+                volume_id: [volume.state, volume.size, volume.volume_type, volume.attached]
+                for volume_id, volume in resources['EBS'].items()
+            },
+            snapshots=snapshots,
+            classic_elb={
+                name: sorted(i['InstanceId'] for i in lb['instanceId'])
+                for name, lb in resources['ELB'].items()
+            },
+            network_elb=resources['ELBV2'].get('Length', 0),
+            snapshot_watermark=snapshot_watermark,
+            last_full=last_full,
+            saved=time.time()
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def to_json(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['version'] = STATE_VERSION
+        return data
+
+    def full_due(self, full_every, now=None):
+        now = time.time() if now is None else now
+        return now - self.last_full >= full_every
+
+    # start-time filter values, one wildcard per day from the watermark's
+    # day to today, or None when there is no watermark or the gap is too
+    # long and snapshots must be fetched in full
+    def snapshot_days(self, now=None):
+        if self.snapshot_watermark is None:
+            return None
+        start = datetime.fromisoformat(self.snapshot_watermark).astimezone(timezone.utc).date()
+        today = (now or datetime.now(timezone.utc)).date()
+        days = (today - start).days
+        if days < 0 or days > MAX_DELTA_DAYS:
+            return None
+        return [
+            '{}*'.format((start + timedelta(days=n)).isoformat())
+            for n in range(days + 1)
+        ]
+
+    # Resources added, removed or changed since previous, as
+    # (service, resource, change, detail) rows
+    def changes(self, previous):
+        rows = []
+        for service, current, before in [
+            ('EC2', self.instances, previous.instances),
+            ('EBS', self.volumes, previous.volumes),
+            ('Snapshots', self.snapshots, previous.snapshots),
+            ('ELB', self.classic_elb, previous.classic_elb),
+        ]:
+            for resource in current.keys() - before.keys():
+                rows.append((service, resource, 'added', describe(current[resource])))
+            for resource in before.keys() - current.keys():
+                rows.append((service, resource, 'removed', describe(before[resource])))
+            for resource in current.keys() & before.keys():
+                if current[resource] != before[resource]:
+                    rows.append((
+                        service,
+                        resource,
+                        'changed',
+                        '{} -> {}'.format(describe(before[resource]), describe(current[resource]))
+                    ))
+        if self.network_elb != previous.network_elb:
+            rows.append((
+                'ELBV2',
+                '',
+                'changed',
+                '{} -> {}'.format(previous.network_elb, self.network_elb)
+            ))
+        rows.sort()
+        return rows
+
+
+def describe(value):
+    if isinstance(value, list):
+        return ' '.join(str(v) for v in value)
+    return str(value)
+
+
+class InventoryStore:
+    def __init__(self, state_dir=None):
+        self.state_dir = state_dir or DEFAULT_STATE_DIR
+
+    def path(self, account, region):
+        return os.path.join(self.state_dir, '{}-{}{}'.format(account, region, STATE_SUFFIX))
+
+    # Saved state of a region, None when there is none or it can't be read
+    def load(self, account, region):
+        try:
+            with open(self.path(account, region), encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get('version') != STATE_VERSION:
+            return None
+        return RegionState.from_json(data)
+
+    # Written to a temporary name and renamed into place, so a run that
+    # dies mid-write leaves the previous state intact
+    def save(self, account, region, state):
+        with atomic_write(self.path(account, region)) as f:
+            json.dump(state.to_json(), f, separators=(',', ':'))
@@ -0,0 +1,209 @@
+import csv
+import gzip
+import io
+
+# Streaming readers for the public AmazonEC2 bulk offer file
+# (https://pricing.us-east-1.amazonaws.com/offers/v1.0/aws/AmazonEC2/current/index.{json,csv}).
+# Both readers turn the file into items shaped like GetProducts PriceList
+# entries ({'product': ..., 'terms': {term type: {offer: term}}}), one
+# term per item, so pricing_info's per-item parsers can consume them
+# unchanged. Neither reader holds more than the products it was asked to
+# keep (JSON) or the rows of one term (CSV) in memory.
+#
+# route(product) decides which price list families a product feeds; items
+# are yielded as (families, item) and products routed nowhere are dropped.
+
+# CSV column names of the product attributes pricing_info reads, mapped to
+# their GetProducts attribute names
+CSV_ATTRIBUTES = {
+    'serviceCode': 'servicecode',
+    'Location': 'location',
+    'Location Type': 'locationType',
+    'Region Code': 'regionCode',
+    'Instance Type': 'instanceType',
+    'Volume Type': 'volumeType',
+    'Max Volume Size': 'maxVolumeSize',
+    'usageType': 'usagetype',
+    'operation': 'operation',
+    'Tenancy': 'tenancy',
+    'Operating System': 'operatingSystem',
+    'License Model': 'licenseModel',
+    'CapacityStatus': 'capacitystatus',
+    'Pre Installed S/W': 'preInstalledSw',
+}
+
+# CSV columns that describe the price rather than the product
+CSV_PRICE_COLUMNS = (
+    'SKU',
+    'OfferTermCode',
+    'RateCode',
+    'TermType',
+    'PriceDescription',
+    'EffectiveDate',
+    'StartingRange',
+    'EndingRange',
+    'Unit',
+    'PricePerUnit',
+    'Currency',
+    'LeaseContractLength',
+    'PurchaseOption',
+    'OfferingClass',
+    'Product Family',
+)
+
+TERM_ATTRIBUTE_COLUMNS = ('LeaseContractLength', 'OfferingClass', 'PurchaseOption')
+
+# Sections of the JSON offer file holding one object per SKU
+JSON_PRODUCTS = 'products'
+JSON_TERMS = ('terms.OnDemand', 'terms.Reserved')
+
+
+def open_offer_file(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def offer_items(path, route):
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        with open_offer_file(path, 'rb') as f:
+            text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+            yield from csv_offer_items(text, route)
+    else:
+        with open_offer_file(path, 'rb') as f:
+            yield from json_offer_items(f, route)
+
+
+# The JSON offer file lists every product before the terms. Products are
+# kept only when route() sends them somewhere, then every OnDemand and
+# Reserved entry of a kept SKU is yielded as soon as it has been read.
+def json_offer_items(f, route):
+    try:
+        import ijson
+        from ijson.common import ObjectBuilder
+    except ImportError:
+        raise RuntimeError(
+            'Reading a JSON offer file needs the ijson package, '
+            'install aws_audit[offer-json] or use the CSV offer file'
+        )
+
+    products = {}
+    section = None
+    sku = None
+    builder = None
+    builder_prefix = None
+
+    for prefix, event, value in ijson.parse(f):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == builder_prefix and event == 'end_map':
+                obj = builder.value
+                builder = None
+                if section == JSON_PRODUCTS:
+                    families = route(obj)
+                    if families:
+                        products[sku] = (families, obj)
+                elif sku in products:
+                    families, product = products[sku]
+                    term_type = section.split('.', 1)[1]
+                    yield families, {'product': product, 'terms': {term_type: obj}}
+            continue
+
+        if event == 'map_key' and (prefix == JSON_PRODUCTS or prefix in JSON_TERMS):
+            section = prefix
+            sku = value
+        elif event == 'start_map' and section is not None and prefix == section + '.' + sku:
+            builder = ObjectBuilder()
+            builder.event(event, value)
+            builder_prefix = prefix
+
+
+# Rows of one term (SKU, term type, offer code) are adjacent in the CSV
+# offer file; they are grouped into a single item with one price
+# dimension per row.
+def csv_offer_items(f, route):
+    reader = csv.reader(f)
+    header = None
+    for row in reader:
+        if row and row[0] == 'SKU':
+            header = row
+            break
+    if header is None:
+        return
+
+    attribute_columns = [
+        (index, CSV_ATTRIBUTES.get(column, column))
+        for index, column in enumerate(header)
+        if column not in CSV_PRICE_COLUMNS
+    ]
+    columns = {column: index for index, column in enumerate(header)}
+
+    current_key = None
+    families = None
+    item = None
+    for row in reader:
+        key = (
+            row[columns['SKU']],
+            row[columns['TermType']],
+            row[columns['OfferTermCode']]
+        )
+        if key != current_key:
+            if item is not None and families:
+                yield families, item
+            current_key = key
+            item = csv_item(row, columns, attribute_columns)
+            families = route(item['product'])
+        if families:
+            csv_add_price_dimension(item, row, columns)
+
+    if item is not None and families:
+        yield families, item
+
+
+def csv_item(row, columns, attribute_columns):
+    sku = row[columns['SKU']]
+    offer_term_code = row[columns['OfferTermCode']]
+    term_attributes = {}
+    for column in TERM_ATTRIBUTE_COLUMNS:
+        if column in columns and row[columns[column]]:
+            term_attributes[column] = row[columns[column]]
+
+    return {
+        'product': {
+            'sku': sku,
+            'productFamily': row[columns['Product Family']],
+            'attributes': {
+                attribute: row[index]
+                for index, attribute in attribute_columns
+                if row[index]
+            }
+        },
+        'terms': {
+            row[columns['TermType']]: {
+                '{}.{}'.format(sku, offer_term_code): {
+                    'offerTermCode': offer_term_code,
+                    'sku': sku,
+                    'effectiveDate': row[columns['EffectiveDate']],
+                    'priceDimensions': {},
+                    'termAttributes': term_attributes
+                }
+            }
+        }
+    }
+
+
+def csv_add_price_dimension(item, row, columns):
+    for term in item['terms'].values():
+        for offer in term.values():
+            rate_code = row[columns['RateCode']]
+            offer['priceDimensions'][rate_code] = {
+                'rateCode': rate_code,
+                'description': row[columns['PriceDescription']],
+                'unit': row[columns['Unit']],
+                'beginRange': row[columns['StartingRange']],
+                'endRange': row[columns['EndingRange']],
+                'pricePerUnit': {
+                    row[columns['Currency']]: row[columns['PricePerUnit']]
+                }
+            }
@@ -0,0 +1,101 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_audit.aws_auditing_list import (
+    pricing_table,
+    resources_table
+)
+
+# asyncio driver for AWSAudit. Pricing and resource discovery don't depend
+# on each other, so the price lists are fetched while every region is
+# discovered, and each region's report is printed as soon as its
+# inventory (and the prices, with --pricing) are in. An audit then takes
+# about max(pricing, discovery) instead of their sum.
+#
+# boto3 clients block, so every AWS call and cost computation runs on a
+# thread pool through run_in_executor; the event loop only schedules the
+# work and prints the reports (or writes a region's rows with
+# --output-format ndjson or csv), which keeps the output of regions from
+# interleaving. Pricing gets its own thread so it never waits behind
+# discovery for a worker.
+
+
+class AuditPipeline:
+    def __init__(self, audit, workers=16):
+        self.audit = audit
+        self.workers = workers
+        self.reports = {}
+
+    def run(self):
+        asyncio.run(self.audit_regions())
+        return self.audit
+
+    async def audit_regions(self):
+        audit = self.audit
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1) as pricing_executor, \
+                ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            self.loop = loop
+            self.executor = executor
+
+            prices = None
+            if audit.args.pricing:
+                prices = loop.run_in_executor(
+                    pricing_executor, audit.price_engine, audit.aws_regions
+                )
+
+            try:
+                await self.call(audit.identify)
+                await asyncio.gather(*[
+                    self.region_report(region_name, prices)
+                    for region_name in audit.aws_regions
+                ])
+            finally:
+                # Don't leave a failed pricing fetch unretrieved
+                if prices is not None and prices.done():
+                    prices.exception()
+
+    def call(self, function, *args):
+        return self.loop.run_in_executor(self.executor, function, *args)
+
+    # Discover one region, then print its reports once its prices are in
+    async def region_report(self, region_name, prices):
+        audit = self.audit
+        sections = await asyncio.gather(*[
+            self.call(audit.collect, service, region_name)
+            for service in audit.collectors()
+        ])
+        for section in sections:
+            audit.dictionary[region_name].update(section)
+        if audit.database is not None:
+            await self.call(audit.store_region, region_name)
+        if audit.state_store is not None:
+            changes = await self.call(audit.update_state, region_name)
+            audit.report_changes(region_name, changes)
+
+        if audit.report_writer is not None:
+            engine = None
+            if prices is not None:
+                engine = await prices
+            rows = await self.call(audit.report_rows, region_name, engine)
+            audit.report_writer.write_region(rows)
+            return
+
+        report = self.reports.setdefault(region_name, {})
+        if audit.args.resources:
+            y = resources_table()
+            with audit.profiler.phase('report', report='resources'):
+                audit.add_resource_rows(y, region_name)
+            report['resources'] = y
+            audit.render(y, 'resources')
+
+        if prices is not None:
+            engine = await prices
+            x = pricing_table()
+            await self.call(self.price_rows, x, region_name, engine)
+            report['pricing'] = x
+            audit.render(x, 'pricing')
+
+    def price_rows(self, x, region_name, engine):
+        with self.audit.profiler.phase('report', report='pricing'):
+            self.audit.add_price_rows(x, region_name, engine)
@@ -0,0 +1,167 @@
+import http.client
+import json
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from aws_audit.constants import DEFAULT_DAEMON_URL
+from aws_audit.cost import ServiceCost
+from aws_audit.price_index import (
+    RAISE,
+    PriceNotFoundError
+)
+
+# Client of the pricing daemon (price_daemon.py). RemotePriceIndex has
+# the lookup API of PriceIndex, so a CostEngine can cost an audit with
+# the daemon's warm prices instead of loading price lists itself. Every
+# thread keeps its own HTTP/1.1 connection open to the daemon, so a batch
+# lookup is one round trip. url is http://host:port or unix:///path/to.sock.
+
+DEFAULT_TIMEOUT = 10
+
+
+class PriceDaemonError(RuntimeError):
+    pass
+
+
+# HTTP connection over a Unix domain socket
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=DEFAULT_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RemotePriceIndex:
+    def __init__(self, url=DEFAULT_DAEMON_URL, timeout=DEFAULT_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.local = threading.local()
+        self.price_dump = None
+
+    # Sent to worker processes as the url only, connections are per process
+    def __getstate__(self):
+        return {'url': self.url, 'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            url = urlsplit(self.url)
+            if url.scheme == 'unix':
+                connection = UnixHTTPConnection(url.path, self.timeout)
+            elif url.scheme == 'http':
+                connection = http.client.HTTPConnection(
+                    url.hostname, url.port, timeout=self.timeout
+                )
+            else:
+                raise PriceDaemonError('Unsupported daemon URL {}'.format(self.url))
+            self.local.connection = connection
+        return connection
+
+    # One JSON request. A kept-alive connection the daemon has closed is
+    # reopened, a new connection failing is an error.
+    def request(self, method, path, data=None):
+        body = None
+        headers = {}
+        if data is not None:
+            body = json.dumps(data)
+            headers['Content-Type'] = 'application/json'
+        while True:
+            reused = getattr(self.local, 'connection', None) is not None
+            connection = self.connection()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                self.local.connection = None
+                if not reused:
+                    raise PriceDaemonError(
+                        'Pricing daemon at {} is not reachable: {}'.format(self.url, e)
+                    ) from e
+        result = json.loads(payload)
+        if response.status != 200:
+            raise PriceDaemonError(
+                '{} {}: {}'.format(method, path, result.get('error', response.status))
+            )
+        return result
+
+    def health(self):
+        return self.request('GET', '/health')
+
+    def __len__(self):
+        return self.health()['prices']
+
+    def __contains__(self, key):
+        return self.lookup_many([key], default=None)[0] is not None
+
+    def lookup(
+        self,
+        region,
+        service,
+        resource_type=None,
+        term='OnDemand',
+        purchase_option=None
+    ):
+        return self.lookup_many([(region, service, resource_type, term, purchase_option)])[0]
+
+    def get(
+        self,
+        region,
+        service,
+        resource_type=None,
+        term='OnDemand',
+        purchase_option=None,
+        default=None
+    ):
+        return self.lookup_many(
+            [(region, service, resource_type, term, purchase_option)],
+            default=default
+        )[0]
+
+    # Prices for a batch of keys in one request, see PriceIndex.lookup_many
+    def lookup_many(self, keys, default=RAISE):
+        keys = [list(key) for key in keys]
+        prices = self.request('POST', '/prices', {'keys': keys})['prices']
+        if default is not RAISE:
+            return [default if price is None else price for price in prices]
+        for key, price in zip(keys, prices):
+            if price is None:
+                raise PriceNotFoundError(tuple(key))
+        return prices
+
+    # Monthly cost of a service's usage computed by the daemon, see
+    # CostEngine.service_cost
+    def service_cost(self, region, service, usage, per_month_hours=730.5):
+        result = self.request('POST', '/costs', {
+            'region': region,
+            'service': service,
+            'usage': [list(row) for row in usage],
+            'per_month_hours': per_month_hours,
+        })
+        return ServiceCost(
+            result['labels'],
+            result['counts'],
+            result['quantities'],
+            result['prices'],
+            result['costs']
+        )
+
+    # Every price of the daemon as a PriceIndex.prices dict, fetched once
+    @property
+    def prices(self):
+        if self.price_dump is None:
+            self.price_dump = {
+                tuple(entry[:5]): entry[5]
+                for entry in self.request('GET', '/prices')['prices']
+            }
+        return self.price_dump
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer
+)
+from urllib.parse import (
+    parse_qs,
+    urlsplit
+)
+
+from aws_audit import aws_auditing_list
+from aws_audit.constants import (
+    DAEMON_HOST,
+    DAEMON_PORT,
+    aws_region
+)
+from aws_audit.cost import CostEngine
+
+# Pricing daemon. Prices are loaded once into a PriceIndex kept in
+# memory and served to any number of tools over a local HTTP API, on a
+# TCP port or a Unix socket:
+#
+#     GET  /health  prices loaded, when, and the last refresh error
+#     GET  /prices  every price as [region, service, type, term,
+#                   purchase option, usd] rows, ?region= to filter
+#     POST /prices  {"keys": [[region, service, type, term, option], ...]}
+#                   -> {"prices": [usd or null, ...]}
+#     POST /costs   {"region", "service", "usage": [[label, type, count,
+#                   quantity], ...], "per_month_hours"} -> the columns of
+#                   CostEngine.service_cost
+#
+# A background thread reloads the prices from the pricing API every
+# refresh_every seconds, bypassing the pricing cache, into a new index
+# and swaps it in with one assignment, so readers are never blocked and
+# always see a complete index; a failed refresh keeps the previous one.
+# price_client.RemotePriceIndex is the client.
+
+DEFAULT_REFRESH_EVERY = 6
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+class PriceDaemon:
+    def __init__(self, load, refresh_every=DEFAULT_REFRESH_EVERY * 60 * 60):
+        # load(refresh) returns a new PriceIndex, refresh is True for the
+        # background reloads, which must not be served from a cache that
+        # may be older than refresh_every
+        self.load = load
+        self.refresh_every = refresh_every
+        # (PriceIndex, time loaded), replaced as a whole on refresh
+        self.current = None
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def refresh(self, refresh=True):
+        self.current = (self.load(refresh), time.time())
+        self.error = None
+
+    # Load the prices, from the cache when it is fresh, then keep
+    # refreshing them in the background
+    def start(self):
+        self.refresh(refresh=False)
+        self.thread = threading.Thread(target=self.refresh_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def refresh_loop(self):
+        while not self.stopped.wait(self.refresh_every):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.error = '{}: {}'.format(type(e).__name__, e)
+                print('Price refresh failed, {}'.format(self.error), file=sys.stderr)
+
+    def health(self):
+        index, loaded = self.current
+        return {
+            'status': 'ok',
+            'prices': len(index),
+            'loaded': loaded,
+            'age': time.time() - loaded,
+            'error': self.error,
+        }
+
+    def prices(self, keys):
+        index, _ = self.current
+        return index.lookup_many([tuple(key) for key in keys], default=None)
+
+    def price_rows(self, region=None):
+        index, _ = self.current
+        return [
+            list(key) + [usd]
+            for key, usd in index.prices.items()
+            if region is None or key[0] == region
+        ]
+
+    def costs(self, region, service, usage, per_month_hours):
+        index, _ = self.current
+        cost = CostEngine(index, per_month_hours).service_cost(
+            region, service, [tuple(row) for row in usage]
+        )
+        return {
+            'labels': list(cost.labels),
+            'counts': list(cost.counts),
+            'quantities': list(cost.quantities),
+            'prices': list(cost.prices),
+            'costs': list(cost.costs),
+            'total_cost': cost.total_cost,
+        }
+
+
+class PriceRequestHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests
+    protocol_version = 'HTTP/1.1'
+    # Responses are buffered and sent in one write when the request is
+    # done, headers and body in separate packets would wait on delayed ACKs
+    wbufsize = -1
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        prices = self.server.prices
+        if url.path == '/health':
+            self.send_json(200, prices.health())
+        elif url.path == '/prices':
+            region = parse_qs(url.query).get('region', [None])[0]
+            self.send_json(200, {'prices': prices.price_rows(region)})
+        else:
+            self.send_json(404, {'error': 'Unknown path {}'.format(url.path)})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        prices = self.server.prices
+        try:
+            data = self.read_json()
+            if path == '/prices':
+                self.send_json(200, {'prices': prices.prices(data['keys'])})
+            elif path == '/costs':
+                self.send_json(200, prices.costs(
+                    data['region'],
+                    data['service'],
+                    data['usage'],
+                    data.get('per_month_hours', 730.5)
+                ))
+            else:
+                self.send_json(404, {'error': 'Unknown path {}'.format(path)})
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json(400, {'error': '{}: {}'.format(type(e).__name__, e)})
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        # read(-1) would block until the client closes the connection
+        if length < 0:
+            raise ValueError('Negative Content-Length {}'.format(length))
+        if length > MAX_BODY_SIZE:
+            raise ValueError('Request body over {} bytes'.format(MAX_BODY_SIZE))
+        return json.loads(self.rfile.read(length))
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Unix socket clients have no address
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    # Only errors are logged, not every request
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    # A socket left behind by a previous daemon is replaced
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='aws-pricing-daemon')
+    parser.add_argument(
+        'region', help='only load the prices of that region', nargs='?'
+    )
+    parser.add_argument('--host', help='address to listen on', default=DAEMON_HOST)
+    parser.add_argument('--port', help='port to listen on', type=int, default=DAEMON_PORT)
+    parser.add_argument(
+        '--socket', help='listen on this Unix socket instead of a TCP port'
+    )
+    parser.add_argument(
+        '--refresh-every',
+        help='hours between price reloads',
+        type=float,
+        default=DEFAULT_REFRESH_EVERY
+    )
+    aws_auditing_list.add_pricing_arguments(parser)
+    return parser
+
+
+# The daemon's options over the defaults of aws-audit, prices are loaded
+# by an AWSAudit with them
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.clear_cache and args.offline:
+        parser.error('--clear-cache cannot be used with --offline')
+    pricing_args = aws_auditing_list.parse_args([])
+    vars(pricing_args).update(vars(args))
+    return args, pricing_args
+
+
+def serve(args, pricing_args):
+    regions = [args.region] if args.region else aws_region
+    # One audit, and so one client registry and rate limiter, for every
+    # load
+    audit = aws_auditing_list.AWSAudit(pricing_args)
+    audit.configure_clients()
+
+    def load(refresh):
+        # Offline there is nothing newer than the cache to refresh from
+        return audit.price_engine(regions, refresh and not args.offline).price_index
+
+    prices = PriceDaemon(load, args.refresh_every * 60 * 60).start()
+    if args.socket:
+        server = UnixHTTPServer(args.socket, PriceRequestHandler)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), PriceRequestHandler)
+        address = 'http://{}:{}'.format(*server.server_address[:2])
+    server.prices = prices
+    print('Serving {} prices on {}'.format(len(prices.current[0]), address), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        prices.stop()
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+def main(argv=None):
+    serve(*parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Flat price index built once from pricing_info.pricing. Every price is
+# parsed to a float up front and stored under a
+# (region, service, type, term, purchase option) key, so lookups are a
+# single dict access.
+#
+# term is 'OnDemand' for on-demand prices. Reserved instance prices use
+# reserved_term(lease length, offering class), e.g. 'Reserved/1yr/standard',
+# for the hourly price and reserved_term(..., upfront=True), e.g.
+# 'Upfront/1yr/standard', for the one-time fee. type is None for services
+# priced per region (ELB, ELBV2, Snapshots) and purchase option is None
+# for on-demand prices.
+
+RAISE = object()
+
+
+def reserved_term(lease_length='1yr', offering_class='standard', upfront=False):
+    return '{}/{}/{}'.format(
+        'Upfront' if upfront else 'Reserved',
+        lease_length,
+        offering_class
+    )
+
+
+class PriceNotFoundError(LookupError):
+    def __init__(self, key):
+        self.key = key
+        super().__init__(
+            'No price for region={} service={} type={} term={} purchase option={}'.format(*key)
+        )
+
+
+class PriceIndex:
+    def __init__(self, prices=None):
+        self.prices = prices if prices is not None else {}
+
+    @classmethod
+    def from_pricing(cls, pricing):
+        prices = {}
+        for region, services in pricing.items():
+            for service, table in services.items():
+                if service in ('EC2', 'EBS'):
+                    for resource_type, terms in table.items():
+                        cls.add_terms(prices, region, service, resource_type, terms)
+                else:
+                    cls.add_terms(prices, region, service, None, table)
+        return cls(prices)
+
+    @staticmethod
+    def add_terms(prices, region, service, resource_type, terms):
+        on_demand = terms.get('OnDemand', {}).get('USD')
+        if on_demand:
+            prices[(region, service, resource_type, 'OnDemand', None)] = float(on_demand)
+
+        for lease_length, offering_classes in terms.get('Reserved', {}).items():
+            for offering_class, offers in offering_classes.items():
+                hourly_term = reserved_term(lease_length, offering_class)
+                upfront_term = reserved_term(lease_length, offering_class, upfront=True)
+                for purchase_option, offer in offers.items():
+                    if offer['HrsUSD']:
+                        prices[(region, service, resource_type, hourly_term, purchase_option)] = float(offer['HrsUSD'])
+                    if offer['UpfrontFeeUSD']:
+                        prices[(region, service, resource_type, upfront_term, purchase_option)] = float(offer['UpfrontFeeUSD'])
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __contains__(self, key):
+        return key in self.prices
+
+    def lookup(
+        self,
+        region,
+        service,
+        resource_type=None,
+        term='OnDemand',
+        purchase_option=None
+    ):
+        key = (region, service, resource_type, term, purchase_option)
+        try:
+            return self.prices[key]
+        except KeyError:
+            raise PriceNotFoundError(key) from None
+
+    def get(
+        self,
+        region,
+        service,
+        resource_type=None,
+        term='OnDemand',
+        purchase_option=None,
+        default=None
+    ):
+        return self.prices.get(
+            (region, service, resource_type, term, purchase_option),
+            default
+        )
+
+    # Prices for a batch of (region, service, type, term, purchase option)
+    # keys. Missing keys raise PriceNotFoundError unless a default is given.
+    def lookup_many(self, keys, default=RAISE):
+        prices = self.prices
+        if default is not RAISE:
+            return [prices.get(key, default) for key in keys]
+
+        result = []
+        for key in keys:
+            try:
+                result.append(prices[key])
+            except KeyError:
+                raise PriceNotFoundError(key) from None
+        return result
@@ -0,0 +1,50 @@
+# Declarative GetProducts queries. A PriceQuery is an immutable service
+# code plus an ordered set of TERM_MATCH filters; refining a query returns
+# a new one, so the per-family base queries can be shared and narrowed
+# per run (e.g. to one region) without copying filter lists around.
+
+
+class PriceQuery:
+    def __init__(self, service_code, filters=()):
+        self.service_code = service_code
+        self.filters = tuple(filters)
+
+    def __repr__(self):
+        return 'PriceQuery({!r}, {!r})'.format(self.service_code, self.filters)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PriceQuery)
+            and self.service_code == other.service_code
+            and self.filters == other.filters
+        )
+
+    def __hash__(self):
+        return hash((self.service_code, self.filters))
+
+    def term_match(self, field, value):
+        return PriceQuery(self.service_code, self.filters + ((field, value),))
+
+    # Restrict the query to one region, pushed down to the pricing API
+    def for_region(self, region):
+        return self.term_match('regionCode', region)
+
+    # Filters in the shape GetProducts expects
+    def api_filters(self):
+        return [
+            {'Type': 'TERM_MATCH', 'Field': field, 'Value': value}
+            for field, value in self.filters
+        ]
+
+    # Evaluate the query locally against a product, used when prices come
+    # from somewhere other than GetProducts
+    def matches(self, product):
+        attributes = product.get('attributes', {})
+        for field, value in self.filters:
+            if field == 'productFamily':
+                actual = product.get('productFamily', attributes.get(field))
+            else:
+                actual = attributes.get(field)
+            if actual != value:
+                return False
+        return True
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import time
+
+from aws_audit.atomic_file import (
+    TMP_PREFIX,
+    atomic_write
+)
+
+# Persistent on-disk cache for GetProducts PriceList items.
+# Every entry is one NDJSON file: a header line followed by one raw
+# PriceList item per line. Files are written to a temporary name and
+# renamed into place, so concurrent runs never read a partial entry.
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'aws_audit',
+    'pricing'
+)
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+ENTRY_SUFFIX = '.ndjson'
+
+
+class PricingCacheMiss(Exception):
+    pass
+
+
+class PricingCache:
+    def __init__(
+        self,
+        cache_dir=None,
+        ttl=DEFAULT_TTL,
+        max_size=DEFAULT_MAX_SIZE
+    ):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.ttl = ttl
+        self.max_size = max_size
+
+    # Cache key from the service code and the GetProducts filter set
+    def key(self, service_code, filters):
+        canonical = json.dumps(
+            {'ServiceCode': service_code, 'Filters': filters},
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    # Returns an iterator over the cached items, or None when the entry
+    # is missing or older than the TTL. Only the header is read here, the
+    # entry is opened again once the iterator is consumed.
+    def get(self, service_code, filters):
+        path = self.path(self.key(service_code, filters))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if time.time() - header.get('created', 0) > self.ttl:
+            return None
+
+        # Last access time drives the LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return self.read_items(path)
+
+    # The file is closed when the items run out or the iterator is closed
+    def read_items(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                yield line.rstrip('\n')
+
+    # Writes the items through to the cache while yielding them. The entry
+    # is only committed once the iterator has been fully consumed.
+    def put(self, service_code, filters, items):
+        header = {
+            'ServiceCode': service_code,
+            'Filters': filters,
+            'created': time.time()
+        }
+        with atomic_write(self.path(self.key(service_code, filters))) as f:
+            f.write(json.dumps(header) + '\n')
+            for item in items:
+                # Raw newlines can only be JSON whitespace here
+                f.write(item.replace('\n', ' ') + '\n')
+                yield item
+        self.evict()
+
+    # Drop expired entries, then the least recently used ones until the
+    # cache fits in max_size
+    def evict(self):
+        now = time.time()
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.startswith(TMP_PREFIX):
+                # Leftovers from runs that died mid-write
+                if now - stat.st_mtime > self.ttl:
+                    self.remove(path)
+                continue
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self.remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self.remove(path)
+            total_size -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith(ENTRY_SUFFIX):
+                self.remove(os.path.join(self.cache_dir, name))
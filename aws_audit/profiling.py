@@ -0,0 +1,286 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-phase timings and AWS API call counters for an audit. pricing_info
+# and AWSAudit time their phases with profiler.phase(name, **labels) and
+# count what they process with profiler.count(name, n, **labels); API
+# calls are counted from botocore events of every client of a
+# ClientRegistry the profiler is attached to, per (service, region,
+# operation): calls (one per page), response bytes, retries, throttles
+# and errors.
+#
+# Hooks added with add_hook(callback) receive every record as a dict as
+# soon as it is taken, e.g. to stream it to an NDJSON file; summary()
+# returns the aggregated totals.
+
+# Error codes AWS returns when a call is throttled
+THROTTLE_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'BandwidthLimitExceeded',
+    'SlowDown',
+    'EC2ThrottledException',
+])
+
+
+# Error code of a botocore (http response, parsed response) pair
+def error_code(response):
+    if response is None:
+        return None
+    parsed = response[1]
+    return parsed.get('Error', {}).get('Code')
+
+
+class Profiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hooks = []
+        self.phases = {}
+        self.counters = {}
+        self.api_calls = {}
+        self.registrations = []
+        self.workers = []
+        self.started = time.time()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def emit(self, record):
+        for hook in self.hooks:
+            hook(record)
+
+    # Wall and CPU time of a block. CPU time is that of the calling
+    # thread, so phases running concurrently don't count each other's.
+    @contextmanager
+    def phase(self, name, **labels):
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(
+                name,
+                time.perf_counter() - start_wall,
+                time.thread_time() - start_cpu,
+                labels
+            )
+
+    # Items of an iterable, each timed as one call of the phase, e.g. the
+    # pages of a paginator
+    def iterate(self, iterable, name, **labels):
+        iterator = iter(iterable)
+        while True:
+            start_wall = time.perf_counter()
+            start_cpu = time.thread_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(
+                name,
+                time.perf_counter() - start_wall,
+                time.thread_time() - start_cpu,
+                labels
+            )
+            yield item
+
+    def record(self, name, wall, cpu, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            totals = self.phases.setdefault(key, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+        self.emit(dict(labels, event='phase', name=name, wall=wall, cpu=cpu))
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.emit(dict(labels, event='count', name=name, value=value))
+
+    # Count the API calls of every client of a ClientRegistry until
+    # detached
+    def attach(self, clients):
+        for event_name, handler, first in [
+            ('after-call', self.after_call, False),
+            ('after-call-error', self.after_call_error, False),
+            ('needs-retry', self.needs_retry, True),
+        ]:
+            self.registrations.append(
+                (clients, clients.register(event_name, handler, first))
+            )
+        return self
+
+    def detach(self):
+        for clients, registration in self.registrations:
+            clients.unregister(registration)
+        self.registrations = []
+
+    # Summary of a profiler of another process, e.g. the worker that
+    # audited one account, kept under 'workers' with its labels
+    def add_summary(self, summary, **labels):
+        summary = dict(summary, **labels)
+        with self.lock:
+            self.workers.append(summary)
+        self.emit(dict(summary, event='worker'))
+
+    def api_counter(self, service, region_name, operation):
+        key = (service, region_name, operation)
+        counter = self.api_calls.get(key)
+        if counter is None:
+            counter = self.api_calls.setdefault(key, {
+                'calls': 0,
+                'response_bytes': 0,
+                'retries': 0,
+                'throttles': 0,
+                'errors': 0,
+            })
+        return counter
+
+    def after_call(self, service, region_name, http_response, parsed, model, **kwargs):
+        size = http_response.headers.get('content-length')
+        if size is None:
+            # Stubbed responses have no body to measure
+            size = len(http_response.raw and http_response.content or b'')
+        size = int(size)
+        retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        failed = http_response.status_code >= 300
+        with self.lock:
+            counter = self.api_counter(service, region_name, model.name)
+            counter['calls'] += 1
+            counter['response_bytes'] += size
+            counter['retries'] += retries
+            if failed:
+                counter['errors'] += 1
+        self.emit({
+            'event': 'api_call',
+            'service': service,
+            'region': region_name,
+            'operation': model.name,
+            'status': http_response.status_code,
+            'response_bytes': size,
+            'retries': retries,
+        })
+
+    # Requests that got no response at all (connection errors, timeouts)
+    def after_call_error(self, service, region_name, event_name, exception=None, **kwargs):
+        operation = event_name.rsplit('.', 1)[-1]
+        with self.lock:
+            self.api_counter(service, region_name, operation)['errors'] += 1
+        self.emit({
+            'event': 'api_error',
+            'service': service,
+            'region': region_name,
+            'operation': operation,
+            'error': type(exception).__name__,
+        })
+
+    # Called after every attempt, before botocore decides whether to retry
+    def needs_retry(self, service, region_name, response=None, operation=None, **kwargs):
+        if error_code(response) not in THROTTLE_ERROR_CODES:
+            return None
+        with self.lock:
+            self.api_counter(service, region_name, operation.name)['throttles'] += 1
+        self.emit({
+            'event': 'throttle',
+            'service': service,
+            'region': region_name,
+            'operation': operation.name,
+        })
+        return None
+
+    def summary(self):
+        with self.lock:
+            return {
+                'started': self.started,
+                'wall': time.perf_counter() - self.start_wall,
+                'cpu': time.process_time() - self.start_cpu,
+                'phases': [
+                    dict(labels, name=name, calls=calls, wall=wall, cpu=cpu)
+                    for (name, labels), (calls, wall, cpu) in sorted(self.phases.items())
+                ],
+                'counters': [
+                    dict(labels, name=name, value=value)
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                'api_calls': [
+                    dict(counter, service=service, region=region_name, operation=operation)
+                    for (service, region_name, operation), counter in sorted(
+                        self.api_calls.items(), key=lambda item: tuple(str(k) for k in item[0])
+                    )
+                ],
+                'workers': list(self.workers),
+            }
+
+
+# Stand-in used when profiling is off, every call is a no-op
+class NullProfiler:
+    @contextmanager
+    def phase(self, name, **labels):
+        yield
+
+    def iterate(self, iterable, name, **labels):
+        return iterable
+
+    def count(self, name, value=1, **labels):
+        pass
+
+    def add_hook(self, hook):
+        pass
+
+    def attach(self, clients):
+        return self
+
+    def detach(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+# Writes the records of a profiler to path as they are taken, one JSON
+# object per line, followed by the summary when closed
+class NdjsonProfileWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w')
+        self.lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def close(self, profiler):
+        self(dict(profiler.summary(), event='summary'))
+        self.file.close()
+
+
+# Profile output for --profile: records streamed to a .ndjson path, or the
+# summary written as one JSON document to any other path
+class ProfileOutput:
+    def __init__(self, profiler, path):
+        self.profiler = profiler
+        self.path = path
+        self.writer = None
+        if path.endswith('.ndjson'):
+            self.writer = NdjsonProfileWriter(path)
+            profiler.add_hook(self.writer)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close(self.profiler)
+        else:
+            with open(self.path, 'w') as f:
+                json.dump(self.profiler.summary(), f, indent=2, default=str)
+                f.write('\n')
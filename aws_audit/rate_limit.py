@@ -0,0 +1,173 @@
+import random
+import threading
+import time
+
+from aws_audit.profiling import (
+    NULL_PROFILER,
+    THROTTLE_ERROR_CODES,
+    error_code
+)
+
+# Client-side rate limiting shared by every AWS call of a ClientRegistry.
+# Each (service, region) endpoint gets a token bucket that every request
+# attempt, retries included, takes a token from before it is sent. The
+# rate adapts to the endpoint: a throttled response halves it and pauses
+# the bucket for a jittered backoff, so every thread calling that
+# endpoint backs off together instead of each retrying into the limit,
+# and every successful response raises it again by RATE_INCREASE up to
+# the configured maximum.
+#
+# Retries themselves are left to botocore (see ClientRegistry.configure
+# for the retry mode and attempts); this only spaces the attempts out.
+# A registry has one limiter (ClientRegistry.shared_rate_limiter), so
+# audits sharing a registry share its buckets. Buckets are per process,
+# worker processes of a multi-account audit each have their own.
+
+DEFAULT_MAX_RATE = 20.0
+MIN_RATE = 0.5
+# Requests per second added to the rate after each successful response
+RATE_INCREASE = 0.5
+# Rate multiplier applied on each throttled response
+RATE_DECREASE = 0.5
+# Backoff after a throttle, in seconds, doubling with each consecutive one
+BASE_DELAY = 0.25
+MAX_DELAY = 20.0
+
+
+class TokenBucket:
+    def __init__(self, rate, min_rate=MIN_RATE):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttles = 0
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    # Take a token, sleeping until one is available. Returns the seconds
+    # waited.
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                delay = self.paused_until - now
+                if delay <= 0:
+                    self.refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    # Halve the rate and pause for a full-jitter backoff, tokens only
+    # accrue again once the pause is over. Returns the pause in seconds.
+    def throttled(self, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+            self.throttles += 1
+            backoff = random.uniform(0, min(max_delay, base_delay * 2 ** self.throttles))
+            self.paused_until = max(self.paused_until, time.monotonic() + backoff)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+            return backoff
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+            self.throttles = 0
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        max_rate=DEFAULT_MAX_RATE,
+        min_rate=MIN_RATE,
+        base_delay=BASE_DELAY,
+        max_delay=MAX_DELAY,
+        profiler=NULL_PROFILER
+    ):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.profiler = profiler
+        self.buckets = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    # Limit every client of a ClientRegistry, those already created and
+    # those created afterwards
+    def attach(self, clients):
+        clients.register('before-send', self.before_send)
+        clients.register('needs-retry', self.needs_retry, first=True)
+        return self
+
+    def bucket(self, service, region_name):
+        key = (service, region_name)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = TokenBucket(self.max_rate, self.min_rate)
+                    self.counters[key] = {
+                        'requests': 0,
+                        'retries': 0,
+                        'throttles': 0,
+                        'wait': 0.0,
+                    }
+        return bucket
+
+    # Called before every attempt is sent, retries included
+    def before_send(self, service, region_name, request=None, **kwargs):
+        waited = self.bucket(service, region_name).acquire()
+        attempt = 1
+        if request is not None:
+            attempt = request.context.get('retries', {}).get('attempt', 1)
+        with self.lock:
+            counter = self.counters[(service, region_name)]
+            counter['requests'] += 1
+            counter['wait'] += waited
+            if attempt > 1:
+                counter['retries'] += 1
+        if attempt > 1:
+            self.profiler.count('retried_calls', service=service, region=region_name)
+        if waited:
+            self.profiler.count('rate_limit_wait', waited, service=service, region=region_name)
+        return None
+
+    # Called after every attempt, before botocore decides whether to retry
+    def needs_retry(self, service, region_name, response=None, **kwargs):
+        bucket = self.bucket(service, region_name)
+        if error_code(response) in THROTTLE_ERROR_CODES:
+            bucket.throttled(self.base_delay, self.max_delay)
+            with self.lock:
+                self.counters[(service, region_name)]['throttles'] += 1
+            self.profiler.count('throttled_calls', service=service, region=region_name)
+        elif response is not None and response[0].status_code < 300:
+            bucket.succeeded()
+        return None
+
+    # Counters and current rate of every endpoint called
+    def summary(self):
+        with self.lock:
+            return [
+                dict(
+                    counter,
+                    service=service,
+                    region=region_name,
+                    rate=self.buckets[(service, region_name)].rate
+                )
+                for (service, region_name), counter in sorted(
+                    self.counters.items(), key=lambda item: tuple(str(k) for k in item[0])
+                )
+            ]
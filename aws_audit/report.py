@@ -0,0 +1,119 @@
+import csv
+import json
+
+# Machine-readable audit reports. Every line of the resources, pricing and
+# changes reports is a ReportRow with typed fields, and writers stream the
+# rows of one region at a time, flushing after each, so a consumer reading
+# the output can process a region while the next is still being audited.
+#
+# report is 'resources', 'pricing' or 'changes', or 'error' for an
+# account of a multi-account audit that failed; service is the report
+# section (EC2, ELB, ELBV2, Attached Volume, Orphaned Volume, Snapshots
+# for resources and pricing, the inventory section for changes); type is
+# the instance or volume type, snapshot kind or changed resource id;
+# quantity is instances or GB billed; price is the unit price in USD
+# (per hour or per GB-month) and cost the monthly cost in USD, None when
+# the price list has no entry.
+
+REPORT_FIELDS = (
+    'account',
+    'region',
+    'report',
+    'service',
+    'type',
+    'count',
+    'quantity',
+    'price',
+    'cost',
+    'detail',
+)
+
+
+class ReportRow:
+    __slots__ = REPORT_FIELDS
+
+    def __init__(
+        self,
+        account,
+        region,
+        report,
+        service,
+        type='',
+        count=None,
+        quantity=None,
+        price=None,
+        cost=None,
+        detail=''
+    ):
+        self.account = account
+        self.region = region
+        self.report = report
+        self.service = service
+        self.type = type
+        self.count = count
+        self.quantity = quantity
+        self.price = price
+        self.cost = cost
+        self.detail = detail
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in REPORT_FIELDS}
+
+
+# Pricing rows of one region from AWSAudit.region_costs
+def cost_rows(account, region, costs):
+    rows = []
+    for service, cost in costs.items():
+        for label, count, quantity, price, line_cost in cost.lines():
+            rows.append(ReportRow(
+                account,
+                region,
+                'pricing',
+                service,
+                label,
+                count,
+                quantity,
+                price,
+                line_cost if price is not None else None
+            ))
+    return rows
+
+
+# Change rows of one region from RegionState.changes
+def change_rows(account, region, changes):
+    return [
+        ReportRow(account, region, 'changes', service, resource, detail='{}: {}'.format(change, detail))
+        for service, resource, change, detail in changes
+    ]
+
+
+class NdjsonReportWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write_region(self, rows):
+        for row in rows:
+            self.stream.write(json.dumps(row.as_dict()) + '\n')
+        self.stream.flush()
+
+
+class CsvReportWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(REPORT_FIELDS)
+        self.stream.flush()
+
+    def write_region(self, rows):
+        self.writer.writerows(
+            ['' if value is None else value for value in (getattr(row, field) for field in REPORT_FIELDS)]
+            for row in rows
+        )
+        self.stream.flush()
+
+
+# Writer of each --output-format, 'table' prints the PrettyTable reports
+REPORT_WRITERS = {
+    'ndjson': NdjsonReportWriter,
+    'csv': CsvReportWriter,
+}
@@ -0,0 +1,295 @@
+import sqlite3
+import threading
+import time
+
+from aws_audit.cost import ServiceCost
+
+# SQLite store for audits. Every run is one row of audits, and the
+# inventory and the prices it was costed with are kept under its id, so
+# costs of past runs can be queried without auditing again:
+#
+#     SELECT account, region, service, SUM(cost)
+#     FROM line_costs GROUP BY account, region, service
+#
+# line_costs is a view computing the cost of every line of the pricing
+# report (per region and section: instance type, volume type, snapshots)
+# with indexed joins of the inventory against the prices, and
+# region_costs() reads it back as the ServiceCost objects the reports
+# are rendered from. Costs are monthly: hourly prices are multiplied by
+# the audit's per_month_hours. Prices use '' rather than NULL for the
+# type and purchase option of per-region and on-demand prices so the
+# joins are plain equalities.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS audits (
+    id INTEGER PRIMARY KEY,
+    account TEXT,
+    started REAL NOT NULL,
+    per_month_hours REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audit_regions (
+    audit_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    PRIMARY KEY (audit_id, region)
+);
+CREATE TABLE IF NOT EXISTS instances (
+    audit_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    instance_type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    key_name TEXT,
+    launch_time REAL,
+    PRIMARY KEY (audit_id, region, instance_id)
+);
+CREATE INDEX IF NOT EXISTS instances_by_type
+    ON instances (audit_id, region, state, instance_type);
+CREATE TABLE IF NOT EXISTS volumes (
+    audit_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    volume_id TEXT NOT NULL,
+    volume_type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    attached INTEGER NOT NULL,
+    PRIMARY KEY (audit_id, region, volume_id)
+);
+CREATE INDEX IF NOT EXISTS volumes_by_type
+    ON volumes (audit_id, region, attached, volume_type);
+CREATE TABLE IF NOT EXISTS snapshots (
+    audit_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    snapshot_id TEXT NOT NULL,
+    volume_id TEXT NOT NULL,
+    PRIMARY KEY (audit_id, region, snapshot_id)
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_volume
+    ON snapshots (audit_id, region, volume_id);
+CREATE TABLE IF NOT EXISTS load_balancers (
+    audit_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    instance_count INTEGER,
+    PRIMARY KEY (audit_id, region, kind, name)
+);
+CREATE TABLE IF NOT EXISTS prices (
+    audit_id INTEGER NOT NULL,
+    region TEXT NOT NULL,
+    service TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    term TEXT NOT NULL,
+    purchase_option TEXT NOT NULL,
+    usd REAL NOT NULL,
+    PRIMARY KEY (audit_id, region, service, resource_type, term, purchase_option)
+);
+CREATE VIEW IF NOT EXISTS line_costs AS
+SELECT i.audit_id, a.account, i.region, 'EC2' AS section, 'EC2' AS service,
+       0 AS line, i.instance_type AS type, COUNT(*) AS count, COUNT(*) AS quantity,
+       p.usd AS price, COUNT(*) * p.usd * a.per_month_hours AS cost
+FROM instances i
+JOIN audits a ON a.id = i.audit_id
+LEFT JOIN prices p ON p.audit_id = i.audit_id AND p.region = i.region
+    AND p.service = 'EC2' AND p.resource_type = i.instance_type
+    AND p.term = 'OnDemand' AND p.purchase_option = ''
+WHERE i.state = 'running'
+GROUP BY i.audit_id, i.region, i.instance_type
+UNION ALL
+SELECT c.audit_id, a.account, c.region, c.service, c.service,
+       0, '', c.n, c.n, p.usd, c.n * p.usd * a.per_month_hours
+FROM (
+    SELECT r.audit_id, r.region, k.service, (
+        SELECT COUNT(*) FROM load_balancers l
+        WHERE l.audit_id = r.audit_id AND l.region = r.region AND l.kind = k.kind
+    ) AS n
+    FROM audit_regions r
+    JOIN (SELECT 'ELB' AS service, 'classic' AS kind
+          UNION ALL SELECT 'ELBV2', 'network') k
+) c
+JOIN audits a ON a.id = c.audit_id
+LEFT JOIN prices p ON p.audit_id = c.audit_id AND p.region = c.region
+    AND p.service = c.service AND p.resource_type = ''
+    AND p.term = 'OnDemand' AND p.purchase_option = ''
+UNION ALL
+SELECT v.audit_id, a.account, v.region,
+       CASE WHEN v.attached THEN 'Attached Volume' ELSE 'Orphaned Volume' END, 'EBS',
+       0, v.volume_type, COUNT(*), SUM(v.size), p.usd, SUM(v.size) * p.usd
+FROM volumes v
+JOIN audits a ON a.id = v.audit_id
+LEFT JOIN prices p ON p.audit_id = v.audit_id AND p.region = v.region
+    AND p.service = 'EBS' AND p.resource_type = v.volume_type
+    AND p.term = 'OnDemand' AND p.purchase_option = ''
+GROUP BY v.audit_id, v.region, v.attached, v.volume_type
+UNION ALL
+SELECT c.audit_id, a.account, c.region, 'Snapshots', 'Snapshots',
+       c.line, c.type, c.n, c.quantity, p.usd, c.quantity * p.usd
+FROM (
+    SELECT r.audit_id, r.region, 0 AS line, 'snapshots' AS type,
+           COUNT(v.volume_id) AS n, COALESCE(SUM(v.size), 0) AS quantity
+    FROM audit_regions r
+    LEFT JOIN volumes v ON v.audit_id = r.audit_id AND v.region = r.region
+        AND EXISTS (
+            SELECT 1 FROM snapshots s
+            WHERE s.audit_id = v.audit_id AND s.region = v.region
+                AND s.volume_id = v.volume_id
+        )
+    GROUP BY r.audit_id, r.region
+    UNION ALL
+    SELECT o.audit_id, o.region, 1, 'orphaned snapshots', o.n, o.n
+    FROM (
+        SELECT r.audit_id, r.region, (
+            SELECT COUNT(*) FROM snapshots s
+            WHERE s.audit_id = r.audit_id AND s.region = r.region
+                AND NOT EXISTS (
+                    SELECT 1 FROM volumes v
+                    WHERE v.audit_id = s.audit_id AND v.region = s.region
+                        AND v.volume_id = s.volume_id
+                )
+        ) AS n
+        FROM audit_regions r
+    ) o
+) c
+JOIN audits a ON a.id = c.audit_id
+LEFT JOIN prices p ON p.audit_id = c.audit_id AND p.region = c.region
+    AND p.service = 'Snapshots' AND p.resource_type = ''
+    AND p.term = 'OnDemand' AND p.purchase_option = '';
+'''
+
+# Sections of AWSAudit.region_costs, in report order
+COST_SECTIONS = (
+    'EC2',
+    'ELB',
+    'ELBV2',
+    'Attached Volume',
+    'Orphaned Volume',
+    'Snapshots',
+)
+
+
+class InventoryDatabase:
+    def __init__(self, path):
+        # Regions are stored from discovery threads, so one connection is
+        # shared behind a lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def start_audit(self, per_month_hours, account=None):
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO audits (account, started, per_month_hours) VALUES (?, ?, ?)',
+                (account, time.time(), per_month_hours)
+            )
+            return cursor.lastrowid
+
+    def set_account(self, audit_id, account):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'UPDATE audits SET account = ? WHERE id = ?', (account, audit_id)
+            )
+
+    # Inventory of one region of AWSAudit.dictionary. snapshots are
+    # (snapshot id, volume id) pairs and network_elb the names of the
+    # network load balancers.
+    def add_region(self, audit_id, region, resources, snapshots, network_elb):
+        with self.lock, self.connection:
+            execute = self.connection.executemany
+            self.connection.execute(
+                'INSERT OR IGNORE INTO audit_regions VALUES (?, ?)', (audit_id, region)
+            )
+            execute(
+                'INSERT OR REPLACE INTO instances VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        audit_id,
+                        region,
+                        instance_id,
+                        instance.instance_type,
+                        instance.instance_state,
+                        instance.key_name,
+                        instance.launch_time
+                    )
+                    for instance_id, instance in resources['EC2'].items()
+                )
+            )
+            execute(
+                'INSERT OR REPLACE INTO volumes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        audit_id,
+                        region,
+                        volume_id,
+                        volume.volume_type,
+                        volume.state,
+                        volume.size,
+                        int(volume.attached)
+                    )
+                    for volume_id, volume in resources['EBS'].items()
+                )
+            )
+            execute(
+                'INSERT OR IGNORE INTO snapshots VALUES (?, ?, ?, ?)',
+                (
+                    (audit_id, region, snapshot_id, volume_id)
+                    for snapshot_id, volume_id in snapshots
+                )
+            )
+            execute(
+                'INSERT OR REPLACE INTO load_balancers VALUES (?, ?, ?, ?, ?)',
+                (
+                    (audit_id, region, 'classic', name, len(lb['instanceId']))
+                    for name, lb in resources['ELB'].items()
+                )
+            )
+            execute(
+                'INSERT OR REPLACE INTO load_balancers VALUES (?, ?, ?, ?, ?)',
+                ((audit_id, region, 'network', name, None) for name in network_elb)
+            )
+
+    def add_prices(self, audit_id, price_index):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        audit_id,
+                        region,
+                        service,
+                        resource_type or '',
+                        term,
+                        purchase_option or '',
+                        usd
+                    )
+                    for (region, service, resource_type, term, purchase_option), usd
+                    in price_index.prices.items()
+                )
+            )
+
+    # Costs of one region as {section: ServiceCost}, like
+    # CostEngine-based AWSAudit.region_costs
+    def region_costs(self, audit_id, region):
+        lines = {section: [] for section in COST_SECTIONS}
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT section, type, count, quantity, price, cost FROM line_costs '
+                'WHERE audit_id = ? AND region = ? ORDER BY section, line, type',
+                (audit_id, region)
+            ).fetchall()
+        for section, resource_type, count, quantity, price, cost in rows:
+            lines[section].append((
+                resource_type,
+                count,
+                quantity,
+                price,
+                cost if cost is not None else 0.0
+            ))
+        return {
+            section: ServiceCost(*zip(*section_lines)) if section_lines
+            else ServiceCost((), (), (), (), ())
+            for section, section_lines in lines.items()
+        }
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# Times pricing ingestion, discovery and report generation on synthetic
+# accounts and catalogs (see fixtures.py) served through botocore's
+# Stubber, and records wall time, items/sec and peak memory per scenario
+# and scale. Results are written as JSON so runs on two commits can be
+# compared with --compare.
+# Usage: python benchmarks/audit_suite.py [--scales 1000 10000 100000]
+#        [--scenarios price_lists discovery] [--output FILE] [--compare FILE]
+#
+# Stubbed clients serve responses in the order they were queued, so every
+# scenario runs with one discovery and one pricing worker: the numbers are
+# the client-side cost of an audit, without network latency.
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures
+from aws_audit import decoding
+from aws_audit.all_pricing import pricing_info
+from aws_audit.aws_auditing_list import AWSAudit, parse_args
+from aws_audit.connection import ClientRegistry
+
+REGION = 'us-east-1'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubbedClients:
+    def __init__(self):
+        import boto3
+
+        session = boto3.Session(
+            aws_access_key_id='benchmark',
+            aws_secret_access_key='benchmark',
+            region_name=REGION
+        )
+        self.registry = ClientRegistry(session=session)
+        self.stubbers = {}
+
+    def queue(self, service, region_name, operation, responses):
+        from botocore.stub import Stubber
+
+        key = (service, region_name)
+        if key not in self.stubbers:
+            self.stubbers[key] = Stubber(self.registry.client(service, region_name))
+        for response in responses:
+            self.stubbers[key].add_response(operation, response)
+
+    def activate(self):
+        for stubber in self.stubbers.values():
+            stubber.activate()
+        return self.registry
+
+
+def queue_describe_pages(clients, size):
+    clients.queue('sts', None, 'get_caller_identity', [{
+        'Account': fixtures.ACCOUNT_ID,
+        'UserId': 'benchmark',
+        'Arn': 'arn:aws:iam::{}:user/benchmark'.format(fixtures.ACCOUNT_ID)
+    }])
+    for (service, operation), responses in fixtures.describe_pages(size).items():
+        clients.queue(service, REGION, operation, responses)
+
+
+def discovered_audit(clients, size, argv=()):
+    queue_describe_pages(clients, size)
+    audit = AWSAudit(
+        parse_args([REGION, '--workers', '1', '--pricing-workers', '1'] + list(argv)),
+        clients=clients.activate()
+    )
+    audit.prepare()
+    return audit
+
+
+# Each scenario sets up its fixtures for a scale and returns the timed
+# callable and the number of items it processes
+def price_lists_scenario(scale, args):
+    clients = StubbedClients()
+    clients.queue('pricing', 'us-east-1', 'get_products', fixtures.price_list_pages(scale))
+    info = pricing_info(clients=clients.activate())
+    return (lambda: info.price_lists(workers=1)), scale
+
+
+def discovery_scenario(scale, args):
+    audit = discovered_audit(StubbedClients(), scale)
+    resources = 3 * scale + 2 * max(1, scale // 10)
+    return (lambda: audit.discover_resources(audit.aws_regions, 1)), resources
+
+
+def get_resources_scenario(scale, args):
+    audit = discovered_audit(StubbedClients(), scale)
+    audit.discover_resources(audit.aws_regions, 1)
+    return (lambda: audit.get_resources(audit.aws_regions, audit.volume_ebs)), 2 * scale
+
+
+def get_price_scenario(scale, args):
+    clients = StubbedClients()
+    clients.queue(
+        'pricing', 'us-east-1', 'get_products',
+        fixtures.price_list_pages(args.catalog_items)
+    )
+    audit = discovered_audit(clients, scale, ['--cache-dir', args.cache_dir, '--refresh-pricing'])
+    audit.discover_resources(audit.aws_regions, 1)
+    return (lambda: audit.get_price(audit.aws_regions, audit.volume_ebs)), 2 * scale
+
+
+SCENARIOS = {
+    'price_lists': price_lists_scenario,
+    'discovery': discovery_scenario,
+    'get_resources': get_resources_scenario,
+    'get_price': get_price_scenario,
+}
+
+
+def measure(scenario, scale, args, trace_memory):
+    random.seed(scale)
+    run, items = scenario(scale, args)
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return items, elapsed, peak
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Wall time of each (scenario, scale) against a previous results file
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {
+            (r['scenario'], r['scale']): r for r in json.load(f)['results']
+        }
+    for result in results:
+        before = baseline.get((result['scenario'], result['scale']))
+        if before is None:
+            continue
+        print('{:<14} {:>8} {:>9.3f}s -> {:>9.3f}s  x{:.2f}'.format(
+            result['scenario'],
+            result['scale'],
+            before['seconds'],
+            result['seconds'],
+            result['seconds'] / before['seconds']
+        ), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument(
+        '--catalog-items',
+        help='EC2 price list items served to get_price',
+        type=int,
+        default=1000
+    )
+    parser.add_argument('--no-memory', help='skip the peak memory pass', action='store_true')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='results file of a previous run')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        args.cache_dir = cache_dir
+        for name in args.scenarios:
+            for scale in args.scales:
+                items, elapsed, _ = measure(SCENARIOS[name], scale, args, False)
+                result = {
+                    'scenario': name,
+                    'scale': scale,
+                    'items': items,
+                    'seconds': elapsed,
+                    'items_per_second': items / elapsed if elapsed else None,
+                    'peak_memory_bytes': None,
+                }
+                if not args.no_memory:
+                    result['peak_memory_bytes'] = measure(SCENARIOS[name], scale, args, True)[2]
+                results.append(result)
+                print('{:<14} {:>8} {:>9.3f}s {:>12.0f} items/s'.format(
+                    name, scale, elapsed, result['items_per_second'] or 0
+                ), file=sys.stderr)
+
+    output = json.dumps({
+        'commit': commit(),
+        'python': platform.python_version(),
+        'json_backend': 'orjson' if decoding.orjson is not None else 'json',
+        'results': results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Compares PriceList decoding throughput of the old path (json.loads on
+# every item) with aws_audit.decoding, on a recorded EC2 catalog or on
+# synthetic items.
+# Usage: python benchmarks/decode_throughput.py [--catalog FILE] [--items N]
+# A recorded catalog is a pricing cache entry (see pricing_cache.py): one
+# header line followed by one PriceList item per line.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_audit import decoding
+from aws_audit.all_pricing import REQUIRED_KEYS, pricing_info
+from fixtures import ec2_price_item
+
+
+def load_catalog(path):
+    with open(path) as f:
+        f.readline()
+        return [line.rstrip('\n') for line in f]
+
+
+def throughput(decode, items, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decoded = sum(1 for _ in decode(items))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'seconds': best, 'items_per_second': len(items) / best, 'decoded': decoded}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog', help='recorded EC2 catalog (pricing cache entry)')
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.catalog:
+        items = load_catalog(args.catalog)
+    else:
+        random.seed(0)
+        items = [ec2_price_item(n) for n in range(args.items)]
+
+    info = pricing_info()
+
+    def current(price_list):
+        return (json.loads(item) for item in price_list)
+
+    def selective(price_list):
+        return decoding.decode_items(
+            price_list,
+            required_keys=REQUIRED_KEYS['EC2'],
+            accept=info.known_location
+        )
+
+    def selective_stdlib(price_list):
+        backend = decoding.orjson, decoding.loads
+        decoding.orjson, decoding.loads = None, json.loads
+        try:
+            yield from selective(price_list)
+        finally:
+            decoding.orjson, decoding.loads = backend
+
+    results = {
+        'items': len(items),
+        'json_backend': 'orjson' if decoding.orjson is not None else 'json',
+        'current': throughput(current, items, args.repeat),
+        'selective_stdlib': throughput(selective_stdlib, items, args.repeat),
+        'selective': throughput(selective, items, args.repeat),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
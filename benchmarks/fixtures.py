@@ -0,0 +1,261 @@
+# Synthetic AWS responses for the benchmarks: GetProducts PriceList items
+# shaped like the real EC2 catalog, and describe_* pages for an account of
+# a given size. Responses are queued on botocore Stubbers so the audit
+# code runs unchanged, with every call served from memory.
+import json
+import random
+from datetime import datetime, timezone
+
+from aws_audit.all_pricing import pricing_info
+from aws_audit.aws_auditing_list import MAX_PAGE_SIZE
+from aws_audit.constants import region_short_names
+
+INSTANCE_TYPES = ['t3.micro', 't3.large', 'm5.large', 'm5.xlarge', 'c5.2xlarge', 'r5.large']
+INSTANCE_STATES = ['running', 'running', 'running', 'stopped', 'terminated']
+INSTANCE_STATE_CODES = {'pending': 0, 'running': 16, 'stopped': 80, 'terminated': 48}
+VOLUME_TYPES = ['gp2', 'io1', 'st1', 'sc1', 'standard']
+LOCATIONS = list(region_short_names) + ['Africa (Cape Town)', 'Asia Pacific (Jakarta)']
+LAUNCH_TIME = datetime(2019, 6, 1, tzinfo=timezone.utc)
+ACCOUNT_ID = '123456789012'
+
+# Items per GetProducts page, the API's own limit
+PRICE_LIST_PAGE_SIZE = 100
+
+
+def price_dimension(sku, code, unit, usd):
+    return {
+        'rateCode': '{}.{}'.format(sku, code),
+        'description': 'synthetic {}'.format(unit),
+        'unit': unit,
+        'pricePerUnit': {'USD': usd},
+        'appliesTo': [],
+        'beginRange': '0',
+        'endRange': 'Inf'
+    }
+
+
+def on_demand_terms(sku, usd):
+    return {
+        sku + '.JRTCKXETXF': {
+            'offerTermCode': 'JRTCKXETXF',
+            'sku': sku,
+            'effectiveDate': '2019-06-01T00:00:00Z',
+            'priceDimensions': {
+                sku + '.JRTCKXETXF.6YS6EN2CT7': price_dimension(sku, 'OD', 'Hrs', usd)
+            },
+            'termAttributes': {}
+        }
+    }
+
+
+def reserved_terms(sku):
+    reserved = {}
+    for lease in ('1yr', '3yr'):
+        for offering_class in ('standard', 'convertible'):
+            for option in ('No Upfront', 'Partial Upfront', 'All Upfront'):
+                code = 'R{}'.format(len(reserved))
+                dimensions = {'{}.{}.H'.format(sku, code): price_dimension(sku, code + 'H', 'Hrs', '0.0500000000')}
+                if option != 'No Upfront':
+                    dimensions['{}.{}.Q'.format(sku, code)] = price_dimension(sku, code + 'Q', 'Quantity', '400')
+                reserved['{}.{}'.format(sku, code)] = {
+                    'offerTermCode': code,
+                    'sku': sku,
+                    'effectiveDate': '2019-06-01T00:00:00Z',
+                    'priceDimensions': dimensions,
+                    'termAttributes': {
+                        'LeaseContractLength': lease,
+                        'OfferingClass': offering_class,
+                        'PurchaseOption': option
+                    }
+                }
+    return reserved
+
+
+def price_item(sku, product_family, attributes, terms):
+    return json.dumps({
+        'product': {'productFamily': product_family, 'attributes': attributes, 'sku': sku},
+        'serviceCode': 'AmazonEC2',
+        'terms': terms,
+        'version': '20190601000000',
+        'publicationDate': '2019-06-01T00:00:00Z'
+    })
+
+
+# One EC2 instance PriceList item with on-demand and every reserved term
+def ec2_price_item(n):
+    sku = 'SKU{:012d}'.format(n)
+    instance_type = random.choice(INSTANCE_TYPES)
+    attributes = {
+        'servicecode': 'AmazonEC2',
+        'location': random.choice(LOCATIONS),
+        'locationType': 'AWS Region',
+        'instanceType': instance_type,
+        'currentGeneration': 'Yes',
+        'instanceFamily': 'General purpose',
+        'vcpu': '2',
+        'physicalProcessor': 'Intel Xeon Platinum 8175',
+        'memory': '8 GiB',
+        'storage': 'EBS only',
+        'networkPerformance': 'Up to 10 Gigabit',
+        'processorArchitecture': '64-bit',
+        'tenancy': 'Shared',
+        'operatingSystem': 'Linux',
+        'licenseModel': 'No License required',
+        'usagetype': 'BoxUsage:{}'.format(instance_type),
+        'operation': 'RunInstances',
+        'capacitystatus': 'Used',
+        'preInstalledSw': 'NA',
+    }
+    terms = {
+        'OnDemand': on_demand_terms(sku, '0.0960000000'),
+        'Reserved': reserved_terms(sku)
+    }
+    return price_item(sku, 'Compute Instance', attributes, terms)
+
+
+# PriceList items of the per-region families, one item per region
+def region_price_items(price_list_type):
+    volume_names = list(pricing_info().volume_types.values())
+    items = []
+    for n, location in enumerate(LOCATIONS):
+        sku = 'SKU{}{:08d}'.format(price_list_type, n)
+        attributes = {
+            'servicecode': 'AmazonEC2',
+            'location': location,
+            'locationType': 'AWS Region',
+            'usagetype': '{}-Usage'.format(price_list_type),
+        }
+        if price_list_type == 'EBS':
+            for m, volume_name in enumerate(volume_names):
+                volume_sku = '{}{}'.format(sku, m)
+                attributes = dict(
+                    attributes,
+                    volumeType=volume_name,
+                    maxVolumeSize='16 TiB'
+                )
+                items.append(price_item(
+                    volume_sku, 'Storage', attributes,
+                    {'OnDemand': on_demand_terms(volume_sku, '0.1000000000')}
+                ))
+            continue
+        family = {
+            'ELB': 'Load Balancer',
+            'ELBV2': 'Load Balancer-Network',
+            'Snapshots': 'Storage Snapshot',
+        }[price_list_type]
+        items.append(price_item(
+            sku, family, attributes, {'OnDemand': on_demand_terms(sku, '0.0250000000')}
+        ))
+    return items
+
+
+def pages(items, page_size, page_key, token_key='NextToken', **extra):
+    pages = []
+    for start in range(0, max(len(items), 1), page_size):
+        page = dict(extra)
+        page[page_key] = items[start:start + page_size]
+        if start + page_size < len(items):
+            page[token_key] = 'token{}'.format(start + page_size)
+        pages.append(page)
+    return pages
+
+
+# GetProducts pages of every family, in the order price_lists(workers=1)
+# requests them, with ec2_items EC2 instance items
+def price_list_pages(ec2_items):
+    families = {
+        'ELBV2': region_price_items('ELBV2'),
+        'ELB': region_price_items('ELB'),
+        'EBS': region_price_items('EBS'),
+        'EC2': [ec2_price_item(n) for n in range(ec2_items)],
+        'Snapshots': region_price_items('Snapshots'),
+    }
+    result = []
+    for price_list_type, items in families.items():
+        for page in pages(items, PRICE_LIST_PAGE_SIZE, 'PriceList', FormatVersion='aws_v1'):
+            result.append(page)
+    return result
+
+
+def instance(n):
+    state = random.choice(INSTANCE_STATES)
+    return {
+        'InstanceId': 'i-%017x' % n,
+        'InstanceType': random.choice(INSTANCE_TYPES),
+        'KeyName': 'ops-key',
+        'LaunchTime': LAUNCH_TIME,
+        'State': {'Name': state, 'Code': INSTANCE_STATE_CODES[state]},
+    }
+
+
+def volume(n):
+    attached = random.random() < 0.7
+    return {
+        'VolumeId': 'vol-%017x' % n,
+        'Size': random.choice([8, 20, 100, 500]),
+        'VolumeType': random.choice(VOLUME_TYPES),
+        'State': 'in-use' if attached else 'available',
+        'Attachments': [{'InstanceId': 'i-%017x' % n}] if attached else [],
+    }
+
+
+# Snapshots mostly of existing volumes, some of deleted ones
+def snapshot(n, volumes):
+    if random.random() < 0.8:
+        volume_id = 'vol-%017x' % random.randrange(volumes)
+    else:
+        volume_id = 'vol-deleted%09x' % n
+    return {
+        'SnapshotId': 'snap-%017x' % n,
+        'VolumeId': volume_id,
+        'VolumeSize': 8,
+        'OwnerId': ACCOUNT_ID,
+    }
+
+
+def classic_load_balancer(n):
+    return {
+        'LoadBalancerName': 'clb-{}'.format(n),
+        'Instances': [{'InstanceId': 'i-%017x' % n}],
+    }
+
+
+def network_load_balancer(n):
+    return {'LoadBalancerName': 'nlb-{}'.format(n), 'Type': 'network'}
+
+
+# describe_* pages of one region of an account with `size` instances,
+# volumes and snapshots and size / 10 load balancers of each kind, keyed
+# by (service, operation) in the order the collectors request them
+def describe_pages(size):
+    load_balancers = max(1, size // 10)
+    instances = [instance(n) for n in range(size)]
+    return {
+        ('ec2', 'describe_instances'): pages(
+            [{'ReservationId': 'r-%017x' % n, 'Instances': [i]} for n, i in enumerate(instances)],
+            MAX_PAGE_SIZE[('ec2', 'describe_instances')],
+            'Reservations'
+        ),
+        ('elb', 'describe_load_balancers'): pages(
+            [classic_load_balancer(n) for n in range(load_balancers)],
+            MAX_PAGE_SIZE[('elb', 'describe_load_balancers')],
+            'LoadBalancerDescriptions',
+            token_key='NextMarker'
+        ),
+        ('elbv2', 'describe_load_balancers'): pages(
+            [network_load_balancer(n) for n in range(load_balancers)],
+            MAX_PAGE_SIZE[('elbv2', 'describe_load_balancers')],
+            'LoadBalancers',
+            token_key='NextMarker'
+        ),
+        ('ec2', 'describe_volumes'): pages(
+            [volume(n) for n in range(size)],
+            MAX_PAGE_SIZE[('ec2', 'describe_volumes')],
+            'Volumes'
+        ),
+        ('ec2', 'describe_snapshots'): pages(
+            [snapshot(n, size) for n in range(size)],
+            MAX_PAGE_SIZE[('ec2', 'describe_snapshots')],
+            'Snapshots'
+        ),
+    }
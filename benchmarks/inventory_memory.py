@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Reports inventory memory use for the compact records against the old
+# nested dict layout, and the time the counters take over them.
+# Usage: python benchmarks/inventory_memory.py [--sizes 100000 1000000]
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_audit.aws_auditing_list import AWSAudit, parse_args
+from aws_audit.inventory import InstanceRecord, VolumeRecord
+from fixtures import INSTANCE_STATES, INSTANCE_TYPES, LAUNCH_TIME, VOLUME_TYPES
+
+
+def legacy_inventory(size):
+    instances = {}
+    volumes = {'orphaned_snapshots': []}
+    for n in range(size):
+        instances['i-%017x' % n] = {
+            'key_name': 'ops-key',
+            'launch_time': LAUNCH_TIME.replace(second=n % 60),
+            'instance_state': random.choice(INSTANCE_STATES),
+            'instance_type': random.choice(INSTANCE_TYPES)
+        }
+        volumes['vol-%017x' % n] = {
+            'state': 'in-use',
+            'snapshots': ['snap-%017x' % n],
+            'size': 100,
+            'volumeType': random.choice(VOLUME_TYPES),
+            'attached': True,
+        }
+    return instances, volumes
+
+
+def compact_inventory(size):
+    instances = {}
+    volumes = {}
+    for n in range(size):
+        instances['i-%017x' % n] = InstanceRecord(
+            'ops-key',
+            LAUNCH_TIME.replace(second=n % 60),
+            random.choice(INSTANCE_STATES),
+            random.choice(INSTANCE_TYPES)
+        )
+        volume = VolumeRecord('in-use', 100, random.choice(VOLUME_TYPES), True)
+        volume.snapshot_count = 1
+        volumes['vol-%017x' % n] = volume
+    return instances, volumes
+
+
+def measure(build, size):
+    gc.collect()
+    tracemalloc.start()
+    inventory = build(size)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return inventory, current, peak
+
+
+def time_counters(instances, volumes):
+    audit = AWSAudit(parse_args([]))
+    region = 'us-east-1'
+    audit.dictionary = {
+        region: {
+            'EC2': instances,
+            'EBS': volumes,
+            'Volumes': {
+                'attached': set(volumes),
+                'unattached': set()
+            },
+            'Snapshots': {'attached': len(volumes), 'orphaned': 0, 'size': 0}
+        }
+    }
+    start = time.perf_counter()
+    audit.count_instance_types(audit.list_instances('running', region), region)
+    audit.count_volume_types('attached', region)
+    audit.count_snapshots('attached', region)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        _, legacy_bytes, legacy_peak = measure(legacy_inventory, size)
+        (instances, volumes), compact_bytes, compact_peak = measure(compact_inventory, size)
+        results.append({
+            'resources': size * 2,
+            'legacy_bytes': legacy_bytes,
+            'legacy_bytes_per_resource': legacy_bytes / (size * 2),
+            'compact_bytes': compact_bytes,
+            'compact_bytes_per_resource': compact_bytes / (size * 2),
+            'compact_peak_bytes': compact_peak,
+            'counters_seconds': time_counters(instances, volumes),
+        })
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
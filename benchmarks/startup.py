@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Measures CLI startup time and fails when it goes over budget.
+# Usage: python benchmarks/startup.py [--budget SECONDS] [--runs N]
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    'import': [sys.executable, '-c', 'import aws_audit.aws_auditing_list'],
+    'help': [sys.executable, '-m', 'aws_audit', '--help'],
+}
+
+# Seconds each command may take, best of --runs
+DEFAULT_BUDGET = 0.25
+DEFAULT_RUNS = 5
+
+# Modules that must not be loaded before the first AWS call or report
+DEFERRED_MODULES = ['boto3', 'botocore', 'prettytable']
+
+
+def time_command(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            command,
+            cwd=ROOT,
+            check=True,
+            stdout=subprocess.DEVNULL
+        )
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def loaded_deferred_modules():
+    check = (
+        'import sys, aws_audit.aws_auditing_list as m; '
+        'm.AWSAudit(m.parse_args(["us-east-1"])); '
+        'print(",".join(n for n in {!r} if n in sys.modules))'
+    ).format(DEFERRED_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', check],
+        cwd=ROOT,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True
+    ).stdout.strip()
+    return [name for name in output.split(',') if name]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET)
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+    args = parser.parse_args()
+
+    failed = False
+    for name, command in COMMANDS.items():
+        elapsed = time_command(command, args.runs)
+        over = elapsed > args.budget
+        failed = failed or over
+        print('{:<8} {:.3f}s {}'.format(
+            name, elapsed, 'OVER BUDGET' if over else 'ok'
+        ))
+
+    loaded = loaded_deferred_modules()
+    if loaded:
+        failed = True
+        print('imported eagerly: {}'.format(', '.join(loaded)))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,13 +15,23 @@ setup(
     keywords="aws audit",
     url="https://github.com/openshift/aws-pricing/",
     packages=['aws_audit'],
+    entry_points={
+        'console_scripts': [
+            'aws-audit=aws_audit.aws_auditing_list:main',
+            'aws-pricing-daemon=aws_audit.price_daemon:main',
+        ],
+    },
     long_description=read('README.md'),
     install_requires=[
-        'boto3>=1.9.163',
+        'boto3>=1.26.0',
         'prettytable>=0.7.2',
         'argparse'
         
     ],
+    extras_require={
+        'offer-json': ['ijson>=3.0'],
+        'fast-json': ['orjson>=3.0'],
+    },
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Topic :: AWS Pricing",
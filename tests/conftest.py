@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The benchmarks' synthetic fixtures and stubbed clients are shared by the
+# tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
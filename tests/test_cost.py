@@ -0,0 +1,82 @@
+import pytest
+
+from aws_audit.cost import CostEngine
+from aws_audit.price_index import (
+    PriceIndex,
+    PriceNotFoundError,
+    reserved_term
+)
+
+PRICING = {
+    'us-east-1': {
+        'EC2': {
+            'm5.large': {
+                'OnDemand': {'USD': '0.0960000000'},
+                'Reserved': {
+                    '1yr': {
+                        'standard': {
+                            'All Upfront': {'HrsUSD': '0.0000000000', 'UpfrontFeeUSD': '500'},
+                            'No Upfront': {'HrsUSD': '0.0600000000', 'UpfrontFeeUSD': ''},
+                        }
+                    }
+                },
+            },
+        },
+        'EBS': {'gp2': {'OnDemand': {'USD': '0.1000000000'}}},
+        'ELB': {'OnDemand': {'USD': '0.0250000000'}},
+        'ELBV2': {},
+        'Snapshots': {'OnDemand': {'USD': '0.0500000000'}},
+    },
+}
+
+
+def test_from_pricing_flattens_every_price():
+    index = PriceIndex.from_pricing(PRICING)
+    assert index.lookup('us-east-1', 'EC2', 'm5.large') == 0.096
+    assert index.lookup('us-east-1', 'EBS', 'gp2') == 0.1
+    assert index.lookup('us-east-1', 'ELB') == 0.025
+    assert index.lookup(
+        'us-east-1', 'EC2', 'm5.large', reserved_term('1yr', 'standard'), 'No Upfront'
+    ) == 0.06
+    assert index.lookup(
+        'us-east-1', 'EC2', 'm5.large', reserved_term('1yr', 'standard', upfront=True), 'All Upfront'
+    ) == 500.0
+    # All Upfront offers cost nothing per hour, empty fields are no price
+    assert index.lookup('us-east-1', 'EC2', 'm5.large', 'Reserved/1yr/standard', 'All Upfront') == 0.0
+    assert ('us-east-1', 'EC2', 'm5.large', 'Upfront/1yr/standard', 'No Upfront') not in index
+    assert len(index) == 7
+
+
+def test_missing_prices():
+    index = PriceIndex.from_pricing(PRICING)
+    with pytest.raises(PriceNotFoundError) as error:
+        index.lookup('us-east-1', 'ELBV2')
+    assert error.value.key == ('us-east-1', 'ELBV2', None, 'OnDemand', None)
+    assert index.get('eu-west-1', 'ELB', default=0) == 0
+    keys = [('us-east-1', 'ELB', None, 'OnDemand', None), ('us-east-1', 'ELBV2', None, 'OnDemand', None)]
+    assert index.lookup_many(keys, default=None) == [0.025, None]
+    with pytest.raises(PriceNotFoundError):
+        index.lookup_many(keys)
+
+
+def test_service_cost_of_hourly_and_storage_services():
+    engine = CostEngine(PriceIndex.from_pricing(PRICING), per_month_hours=730)
+    ec2 = engine.service_cost('us-east-1', 'EC2', [
+        ('m5.large', 'm5.large', 2, 2),
+        ('x1.huge', 'x1.huge', 1, 1),
+    ])
+    assert ec2.prices == [0.096, None]
+    assert ec2.costs == pytest.approx([2 * 0.096 * 730, 0.0])
+    assert ec2.total_count == 2
+    assert ec2.total_cost == pytest.approx(2 * 0.096 * 730)
+
+    # Volumes and snapshots are priced per GB-month
+    ebs = engine.service_cost('us-east-1', 'EBS', [('gp2', 'gp2', 3, 150)])
+    assert ebs.total_cost == pytest.approx(15.0)
+    assert ebs.lines() == [('gp2', 3, 150, 0.1, pytest.approx(15.0))]
+
+
+def test_service_cost_without_usage():
+    cost = CostEngine(PriceIndex()).service_cost('us-east-1', 'ELB', [])
+    assert cost.lines() == []
+    assert cost.total_cost == 0
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from botocore.stub import Stubber
+
+from aws_audit.aws_auditing_list import AWSAudit, parse_args
+from aws_audit.connection import ClientRegistry
+from aws_audit.inventory_state import MAX_DELTA_DAYS, InventoryStore, RegionState
+
+ACCOUNT = '123456789012'
+REGION = 'us-east-1'
+
+
+def test_changes_since_previous_state():
+    previous = RegionState(
+        instances={'i-1': ['running', 'm5.large'], 'i-2': ['running', 'm5.large']},
+        volumes={'vol-1': ['in-use', 10, 'gp2', True]},
+        snapshots={'snap-1': 'vol-1'},
+        network_elb=1
+    )
+    current = RegionState(
+        instances={'i-1': ['stopped', 'm5.large'], 'i-3': ['running', 't3.micro']},
+        volumes={'vol-1': ['in-use', 10, 'gp2', True]},
+        snapshots={'snap-1': 'vol-1', 'snap-2': 'vol-1'},
+        network_elb=2
+    )
+    assert current.changes(previous) == [
+        ('EC2', 'i-1', 'changed', 'running m5.large -> stopped m5.large'),
+        ('EC2', 'i-2', 'removed', 'running m5.large'),
+        ('EC2', 'i-3', 'added', 'running t3.micro'),
+        ('ELBV2', '', 'changed', '1 -> 2'),
+        ('Snapshots', 'snap-2', 'added', 'vol-1'),
+    ]
+    assert current.changes(current) == []
+
+
+def test_snapshot_days():
+    now = datetime(2026, 10, 17, 12, tzinfo=timezone.utc)
+    assert RegionState().snapshot_days(now) is None
+    state = RegionState(snapshot_watermark='2026-10-15T23:00:00+00:00')
+    assert state.snapshot_days(now) == ['2026-10-15*', '2026-10-16*', '2026-10-17*']
+    # The watermark's day is taken in UTC
+    state = RegionState(snapshot_watermark='2026-10-17T01:00:00+02:00')
+    assert state.snapshot_days(now) == ['2026-10-16*', '2026-10-17*']
+    old = (now - timedelta(days=MAX_DELTA_DAYS + 1)).isoformat()
+    assert RegionState(snapshot_watermark=old).snapshot_days(now) is None
+
+
+def test_full_due():
+    state = RegionState(last_full=1000)
+    assert not state.full_due(3600, now=1000 + 3599)
+    assert state.full_due(3600, now=1000 + 3600)
+
+
+def test_store_round_trip(tmp_path):
+    store = InventoryStore(str(tmp_path))
+    assert store.load(ACCOUNT, REGION) is None
+    state = RegionState(
+        instances={'i-1': ['running', 'm5.large']},
+        snapshots={'snap-1': 'vol-1'},
+        snapshot_watermark='2026-10-15T10:00:00+00:00',
+        last_full=1000
+    )
+    store.save(ACCOUNT, REGION, state)
+    loaded = store.load(ACCOUNT, REGION)
+    assert loaded.to_json() == state.to_json()
+    assert [path.name for path in tmp_path.iterdir()] == ['123456789012-us-east-1.json']
+
+
+def test_store_ignores_other_versions(tmp_path):
+    store = InventoryStore(str(tmp_path))
+    (tmp_path / '123456789012-us-east-1.json').write_text('{"version": 0, "instances": {}}')
+    assert store.load(ACCOUNT, REGION) is None
+    (tmp_path / '123456789012-us-east-1.json').write_text('{"vers')
+    assert store.load(ACCOUNT, REGION) is None
+
+
+def instance(instance_id, state, launched):
+    return {
+        'InstanceId': instance_id,
+        'InstanceType': 'm5.large',
+        'LaunchTime': launched,
+        'State': {'Name': state, 'Code': 16 if state == 'running' else 80},
+    }
+
+
+def audit(state_dir, instances, snapshots, snapshot_params):
+    clients = ClientRegistry(session=boto3.Session(
+        aws_access_key_id='key', aws_secret_access_key='secret', region_name=REGION
+    ))
+    ec2 = Stubber(clients.client('ec2', REGION))
+    sts = Stubber(clients.client('sts'))
+    elb = Stubber(clients.client('elb', REGION))
+    elbv2 = Stubber(clients.client('elbv2', REGION))
+    sts.add_response('get_caller_identity', {'Account': ACCOUNT})
+    ec2.add_response('describe_instances', {'Reservations': [{'Instances': instances}]})
+    ec2.add_response('describe_volumes', {'Volumes': []})
+    ec2.add_response('describe_snapshots', {'Snapshots': snapshots}, snapshot_params)
+    elb.add_response('describe_load_balancers', {'LoadBalancerDescriptions': []})
+    elbv2.add_response('describe_load_balancers', {'LoadBalancers': []})
+    for stubber in (ec2, sts, elb, elbv2):
+        stubber.activate()
+    args = parse_args([REGION, '--workers', '1', '--incremental', '--state-dir', state_dir])
+    result = AWSAudit(args, clients=clients).run()
+    for stubber in (ec2, sts, elb, elbv2):
+        stubber.assert_no_pending_responses()
+    return result
+
+
+def test_incremental_audit_fetches_snapshots_since_watermark(tmp_path, capsys):
+    now = datetime.now(timezone.utc)
+    started = now - timedelta(days=1)
+    owner = {'Name': 'owner-id', 'Values': [ACCOUNT]}
+
+    first = audit(
+        str(tmp_path),
+        [instance('i-1', 'running', started)],
+        [{'SnapshotId': 'snap-1', 'VolumeId': 'vol-1', 'StartTime': started}],
+        {'Filters': [owner], 'MaxResults': 1000}
+    )
+    assert first.changes == {}
+
+    days = ['{}*'.format(started.date().isoformat()), '{}*'.format(now.date().isoformat())]
+    second = audit(
+        str(tmp_path),
+        [instance('i-1', 'stopped', started)],
+        [{'SnapshotId': 'snap-2', 'VolumeId': 'vol-2', 'StartTime': now}],
+        {'Filters': [owner, {'Name': 'start-time', 'Values': days}], 'MaxResults': 1000}
+    )
+    assert second.changes[REGION] == [
+        ('EC2', 'i-1', 'changed', 'running m5.large -> stopped m5.large'),
+        ('Snapshots', 'snap-2', 'added', 'vol-2'),
+    ]
+    saved = InventoryStore(str(tmp_path)).load(ACCOUNT, REGION)
+    assert saved.snapshots == {'snap-1': 'vol-1', 'snap-2': 'vol-2'}
+    assert saved.snapshot_watermark == now.isoformat()
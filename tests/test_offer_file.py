@@ -0,0 +1,165 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from aws_audit.all_pricing import pricing_info
+from aws_audit.offer_file import offer_items
+from aws_audit.price_index import reserved_term
+
+LOCATION = 'US East (N. Virginia)'
+
+LINUX_INSTANCE = {
+    'servicecode': 'AmazonEC2',
+    'location': LOCATION,
+    'locationType': 'AWS Region',
+    'regionCode': 'us-east-1',
+    'instanceType': 'm5.large',
+    'usagetype': 'BoxUsage:m5.large',
+    'operation': 'RunInstances',
+    'tenancy': 'Shared',
+    'operatingSystem': 'Linux',
+    'licenseModel': 'No License required',
+    'capacitystatus': 'Used',
+    'preInstalledSw': 'NA',
+}
+WINDOWS_INSTANCE = dict(LINUX_INSTANCE, operatingSystem='Windows', usagetype='BoxUsage:m5.large')
+GP2_VOLUME = {
+    'servicecode': 'AmazonEC2',
+    'location': LOCATION,
+    'locationType': 'AWS Region',
+    'regionCode': 'us-east-1',
+    'volumeType': 'General Purpose',
+    'maxVolumeSize': '16 TiB',
+    'usagetype': 'EBS:VolumeUsage.gp2',
+}
+
+# (sku, product family, attributes)
+PRODUCTS = [
+    ('LINUX', 'Compute Instance', LINUX_INSTANCE),
+    ('WINDOWS', 'Compute Instance', WINDOWS_INSTANCE),
+    ('GP2', 'Storage', GP2_VOLUME),
+]
+# (sku, term type, offer code, unit, usd, term attributes)
+PRICES = [
+    ('LINUX', 'OnDemand', 'JRTCKXETXF', 'Hrs', '0.0960000000', {}),
+    ('LINUX', 'Reserved', '4NA7Y494T4', 'Hrs', '0.0600000000', {
+        'LeaseContractLength': '1yr', 'OfferingClass': 'standard', 'PurchaseOption': 'Partial Upfront'
+    }),
+    ('LINUX', 'Reserved', '4NA7Y494T4', 'Quantity', '262', {
+        'LeaseContractLength': '1yr', 'OfferingClass': 'standard', 'PurchaseOption': 'Partial Upfront'
+    }),
+    ('WINDOWS', 'OnDemand', 'JRTCKXETXF', 'Hrs', '0.1880000000', {}),
+    ('GP2', 'OnDemand', 'JRTCKXETXF', 'GB-Mo', '0.1000000000', {}),
+]
+
+
+def json_offer_file(path):
+    products = {
+        sku: {'sku': sku, 'productFamily': family, 'attributes': attributes}
+        for sku, family, attributes in PRODUCTS
+    }
+    terms = {'OnDemand': {}, 'Reserved': {}}
+    for sku, term_type, offer_code, unit, usd, term_attributes in PRICES:
+        offer = terms[term_type].setdefault(sku, {}).setdefault(
+            '{}.{}'.format(sku, offer_code),
+            {'offerTermCode': offer_code, 'sku': sku, 'priceDimensions': {}, 'termAttributes': term_attributes}
+        )
+        rate_code = '{}.{}.{}'.format(sku, offer_code, unit)
+        offer['priceDimensions'][rate_code] = {
+            'rateCode': rate_code,
+            'description': 'price',
+            'unit': unit,
+            'pricePerUnit': {'USD': usd},
+        }
+    path.write_text(json.dumps({'formatVersion': 'v1.0', 'products': products, 'terms': terms}))
+    return str(path)
+
+
+CSV_COLUMNS = [
+    'SKU', 'OfferTermCode', 'RateCode', 'TermType', 'PriceDescription', 'EffectiveDate',
+    'StartingRange', 'EndingRange', 'Unit', 'PricePerUnit', 'Currency',
+    'LeaseContractLength', 'PurchaseOption', 'OfferingClass', 'Product Family',
+    'serviceCode', 'Location', 'Location Type', 'Region Code', 'Instance Type',
+    'Volume Type', 'Max Volume Size', 'usageType', 'operation', 'Tenancy',
+    'Operating System', 'License Model', 'CapacityStatus', 'Pre Installed S/W',
+]
+CSV_ATTRIBUTE_COLUMNS = {
+    'serviceCode': 'servicecode', 'Location': 'location', 'Location Type': 'locationType',
+    'Region Code': 'regionCode', 'Instance Type': 'instanceType', 'Volume Type': 'volumeType',
+    'Max Volume Size': 'maxVolumeSize', 'usageType': 'usagetype', 'operation': 'operation',
+    'Tenancy': 'tenancy', 'Operating System': 'operatingSystem', 'License Model': 'licenseModel',
+    'CapacityStatus': 'capacitystatus', 'Pre Installed S/W': 'preInstalledSw',
+}
+
+
+def csv_rows():
+    products = {sku: (family, attributes) for sku, family, attributes in PRODUCTS}
+    for sku, term_type, offer_code, unit, usd, term_attributes in PRICES:
+        family, attributes = products[sku]
+        row = dict(term_attributes)
+        row.update({
+            'SKU': sku, 'OfferTermCode': offer_code, 'RateCode': '{}.{}.{}'.format(sku, offer_code, unit),
+            'TermType': term_type, 'PriceDescription': 'price', 'EffectiveDate': '2020-01-01',
+            'StartingRange': '0', 'EndingRange': 'Inf', 'Unit': unit, 'PricePerUnit': usd,
+            'Currency': 'USD', 'Product Family': family,
+        })
+        for column, attribute in CSV_ATTRIBUTE_COLUMNS.items():
+            row[column] = attributes.get(attribute, '')
+        yield [row.get(column, '') for column in CSV_COLUMNS]
+
+
+def write_csv(f):
+    writer = csv.writer(f)
+    # The offer file starts with a few lines of metadata
+    writer.writerow(['FormatVersion', 'v1.0'])
+    writer.writerow(['Disclaimer', 'none'])
+    writer.writerow(CSV_COLUMNS)
+    writer.writerows(csv_rows())
+
+
+def csv_offer_file(path):
+    with open(str(path), 'w', newline='') as f:
+        write_csv(f)
+    return str(path)
+
+
+def csv_gz_offer_file(path):
+    with gzip.open(str(path), 'wt', newline='') as f:
+        write_csv(f)
+    return str(path)
+
+
+@pytest.mark.parametrize('write, name', [
+    (json_offer_file, 'index.json'),
+    (csv_offer_file, 'index.csv'),
+    (csv_gz_offer_file, 'index.csv.gz'),
+])
+def test_offer_file_prices(tmp_path, write, name):
+    info = pricing_info()
+    info.load_offer_file(write(tmp_path / name))
+    index = info.price_index()
+
+    assert index.lookup('us-east-1', 'EC2', 'm5.large') == 0.096
+    assert index.lookup('us-east-1', 'EBS', 'gp2') == 0.1
+    # The hourly and upfront dimensions of a reserved offer are one term
+    assert index.lookup(
+        'us-east-1', 'EC2', 'm5.large', reserved_term('1yr', 'standard'), 'Partial Upfront'
+    ) == 0.06
+    assert index.lookup(
+        'us-east-1', 'EC2', 'm5.large', reserved_term('1yr', 'standard', upfront=True), 'Partial Upfront'
+    ) == 262.0
+    # Windows instances don't match the EC2 price list query
+    assert len(index) == 4
+
+
+@pytest.mark.parametrize('write, name', [
+    (json_offer_file, 'index.json'),
+    (csv_offer_file, 'index.csv'),
+])
+def test_products_routed_nowhere_are_dropped(tmp_path, write, name):
+    path = write(tmp_path / name)
+    routed = list(offer_items(path, lambda product: ['EBS'] if product['sku'] == 'GP2' else []))
+    assert [(families, item['product']['sku']) for families, item in routed] == [(['EBS'], 'GP2')]
+    assert list(routed[0][1]['terms']) == ['OnDemand']
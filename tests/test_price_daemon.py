@@ -0,0 +1,130 @@
+import http.client
+import pickle
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from aws_audit.price_client import PriceDaemonError, RemotePriceIndex
+from aws_audit.price_daemon import PriceDaemon, PriceRequestHandler, UnixHTTPServer
+from aws_audit.price_index import PriceIndex, PriceNotFoundError
+
+M5_LARGE = ('us-east-1', 'EC2', 'm5.large', 'OnDemand', None)
+T3_NANO = ('us-east-1', 'EC2', 't3.nano', 'OnDemand', None)
+PRICES = {
+    M5_LARGE: 0.1,
+    ('us-east-1', 'EBS', 'gp2', 'OnDemand', None): 0.1,
+    ('eu-west-1', 'EC2', 'm5.large', 'OnDemand', None): 0.11,
+}
+
+
+def serve(server):
+    server.prices = PriceDaemon(lambda refresh: PriceIndex(dict(PRICES)))
+    server.prices.refresh()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def daemon():
+    server = serve(ThreadingHTTPServer(('127.0.0.1', 0), PriceRequestHandler))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def url(daemon):
+    return 'http://127.0.0.1:{}'.format(daemon.server_address[1])
+
+
+def test_lookups(url):
+    remote = RemotePriceIndex(url)
+    assert remote.health()['prices'] == 3
+    assert len(remote) == 3
+    assert remote.lookup(*M5_LARGE) == 0.1
+    assert M5_LARGE in remote
+    assert T3_NANO not in remote
+    assert remote.get('us-east-1', 'EC2', 't3.nano', default=0.0) == 0.0
+    assert remote.lookup_many([M5_LARGE, T3_NANO], default=None) == [0.1, None]
+    with pytest.raises(PriceNotFoundError) as e:
+        remote.lookup('us-east-1', 'EC2', 't3.nano')
+    assert e.value.key == T3_NANO
+    assert remote.prices == PRICES
+
+
+def test_service_cost(url):
+    cost = RemotePriceIndex(url).service_cost(
+        'us-east-1', 'EC2', [('m5.large', 'm5.large', 2, 2), ('t3.nano', 't3.nano', 1, 1)], 730
+    )
+    assert cost.lines() == [
+        ('m5.large', 2, 2, 0.1, pytest.approx(146.0)),
+        ('t3.nano', 1, 1, None, 0.0),
+    ]
+
+
+def test_price_rows_by_region(url):
+    connection = http.client.HTTPConnection('127.0.0.1', int(url.rsplit(':', 1)[1]))
+    connection.request('GET', '/prices?region=eu-west-1')
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.read() == b'{"prices": [["eu-west-1", "EC2", "m5.large", "OnDemand", null, 0.11]]}'
+
+
+def test_errors(daemon, url):
+    remote = RemotePriceIndex(url)
+    with pytest.raises(PriceDaemonError, match='Unknown path /nowhere'):
+        remote.request('GET', '/nowhere')
+    with pytest.raises(PriceDaemonError, match='KeyError'):
+        remote.request('POST', '/prices', {'region': 'us-east-1'})
+
+    connection = http.client.HTTPConnection('127.0.0.1', daemon.server_address[1], timeout=5)
+    connection.putrequest('POST', '/prices')
+    connection.putheader('Content-Length', '-1')
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 400
+    assert b'Negative Content-Length' in response.read()
+
+
+def test_unreachable_daemon():
+    with pytest.raises(PriceDaemonError, match='not reachable'):
+        RemotePriceIndex('http://127.0.0.1:1', timeout=1).health()
+
+
+def test_pickled_as_url(url):
+    remote = RemotePriceIndex(url)
+    remote.lookup(*M5_LARGE)
+    copy = pickle.loads(pickle.dumps(remote))
+    assert (copy.url, copy.price_dump) == (url, None)
+    assert copy.lookup(*M5_LARGE) == 0.1
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / 'prices.sock')
+    # A socket left behind by a previous daemon is replaced
+    open(path, 'w').close()
+    server = serve(UnixHTTPServer(path, PriceRequestHandler))
+    try:
+        assert RemotePriceIndex('unix://' + path).lookup(*M5_LARGE) == 0.1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_refresh_keeps_prices():
+    loads = [PriceIndex(dict(PRICES))]
+
+    def load(refresh):
+        if not loads:
+            raise RuntimeError('pricing API down')
+        return loads.pop()
+
+    daemon = PriceDaemon(load, refresh_every=0.01).start()
+    daemon.thread.join(0.5)
+    daemon.stop()
+    daemon.thread.join()
+    health = daemon.health()
+    assert health['prices'] == 3
+    assert health['error'] == 'RuntimeError: pricing API down'
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from aws_audit.atomic_file import TMP_PREFIX
+from aws_audit.pricing_cache import PricingCache
+
+FILTERS = [{'Type': 'TERM_MATCH', 'Field': 'productFamily', 'Value': 'Storage'}]
+
+
+def fill(cache, service_code, items):
+    return list(cache.put(service_code, FILTERS, items))
+
+
+def test_put_then_get_returns_the_items(tmp_path):
+    cache = PricingCache(str(tmp_path))
+    items = ['{"a": 1}', '{"b":\n2}']
+    assert fill(cache, 'AmazonEC2', items) == items
+    # Raw newlines are JSON whitespace, they are flattened to keep one
+    # item per line
+    assert list(cache.get('AmazonEC2', FILTERS)) == ['{"a": 1}', '{"b": 2}']
+    assert cache.get('AmazonEC2', []) is None
+    assert cache.get('AmazonRDS', FILTERS) is None
+
+
+def test_entry_is_only_committed_once_consumed(tmp_path):
+    cache = PricingCache(str(tmp_path))
+    items = cache.put('AmazonEC2', FILTERS, ['{}', '{}'])
+    next(items)
+    items.close()
+    assert os.listdir(str(tmp_path)) == []
+    assert cache.get('AmazonEC2', FILTERS) is None
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    fill(PricingCache(str(tmp_path)), 'AmazonEC2', ['{}'])
+    assert PricingCache(str(tmp_path), ttl=3600).get('AmazonEC2', FILTERS) is not None
+    assert PricingCache(str(tmp_path), ttl=-1).get('AmazonEC2', FILTERS) is None
+
+
+def test_get_does_not_open_the_entry_until_iterated(tmp_path):
+    cache = PricingCache(str(tmp_path))
+    fill(cache, 'AmazonEC2', ['{}'])
+    items = cache.get('AmazonEC2', FILTERS)
+    os.remove(cache.path(cache.key('AmazonEC2', FILTERS)))
+    # Nothing was kept open, so the removed entry is only noticed when read
+    with pytest.raises(FileNotFoundError):
+        list(items)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PricingCache(str(tmp_path))
+    fill(cache, 'Old', ['{"item": 1}'])
+    fill(cache, 'New', ['{"item": 2}'])
+    old = cache.path(cache.key('Old', FILTERS))
+    new = cache.path(cache.key('New', FILTERS))
+    os.utime(old, (1, 1))
+
+    PricingCache(str(tmp_path), max_size=os.path.getsize(new)).evict()
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+
+
+def test_expired_entries_and_stale_temporary_files_are_evicted(tmp_path):
+    cache = PricingCache(str(tmp_path))
+    fill(cache, 'AmazonEC2', ['{}'])
+    leftover = tmp_path / (TMP_PREFIX + 'dead.ndjson')
+    leftover.write_text('partial')
+    os.utime(str(leftover), (1, 1))
+    os.utime(cache.path(cache.key('AmazonEC2', FILTERS)), (1, 1))
+
+    cache.evict()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_clear_removes_every_entry(tmp_path):
+    cache = PricingCache(str(tmp_path))
+    fill(cache, 'AmazonEC2', ['{}'])
+    fill(cache, 'AmazonRDS', ['{}'])
+    cache.clear()
+    assert cache.get('AmazonEC2', FILTERS) is None
+    assert os.listdir(str(tmp_path)) == []
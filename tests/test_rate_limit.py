@@ -0,0 +1,118 @@
+import pytest
+
+from aws_audit import rate_limit
+from aws_audit.rate_limit import AdaptiveRateLimiter, TokenBucket
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+THROTTLED = (Response(400), {'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}})
+SUCCEEDED = (Response(200), {})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_bucket_starts_full(clock):
+    bucket = TokenBucket(5)
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    assert clock.slept == []
+
+
+def test_empty_bucket_waits_for_a_token(clock):
+    bucket = TokenBucket(2)
+    bucket.acquire()
+    bucket.acquire()
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_throttled_bucket_waits_for_the_pause(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit.random, 'uniform', lambda low, high: high)
+    bucket = TokenBucket(4)
+    assert bucket.throttled(base_delay=0.25, max_delay=20) == 0.5
+    # Paused for the backoff, then a token accrues at the halved rate
+    assert bucket.acquire() == pytest.approx(0.5 + 1 / 2)
+
+
+def test_throttled_halves_rate_and_pauses():
+    bucket = TokenBucket(8, min_rate=1)
+    backoff = bucket.throttled(base_delay=0.25, max_delay=20)
+    assert bucket.rate == 4
+    assert 0 <= backoff <= 0.5
+    assert bucket.tokens == 0
+    assert bucket.paused_until == bucket.updated
+    for _ in range(5):
+        bucket.throttled(base_delay=0.25, max_delay=20)
+    assert bucket.rate == 1
+    assert bucket.throttles == 6
+
+
+def test_succeeded_raises_rate_up_to_max():
+    bucket = TokenBucket(2)
+    bucket.throttled(base_delay=0, max_delay=0)
+    assert bucket.rate == 1
+    bucket.succeeded()
+    assert bucket.rate == 1 + rate_limit.RATE_INCREASE
+    assert bucket.throttles == 0
+    for _ in range(10):
+        bucket.succeeded()
+    assert bucket.rate == 2
+
+
+def test_limiter_counts_requests_and_throttles(clock):
+    limiter = AdaptiveRateLimiter(max_rate=10, base_delay=0, max_delay=0)
+    for _ in range(3):
+        limiter.before_send('ec2', 'us-east-1')
+    limiter.needs_retry('ec2', 'us-east-1', response=THROTTLED)
+    limiter.needs_retry('ec2', 'us-east-1', response=SUCCEEDED)
+    limiter.before_send('pricing', 'us-east-1')
+
+    assert limiter.summary() == [
+        {
+            'requests': 3,
+            'retries': 0,
+            'throttles': 1,
+            'wait': 0.0,
+            'service': 'ec2',
+            'region': 'us-east-1',
+            'rate': 5 + rate_limit.RATE_INCREASE,
+        },
+        {
+            'requests': 1,
+            'retries': 0,
+            'throttles': 0,
+            'wait': 0.0,
+            'service': 'pricing',
+            'region': 'us-east-1',
+            'rate': 10,
+        },
+    ]
+
+
+def test_errors_other_than_throttles_leave_the_rate():
+    limiter = AdaptiveRateLimiter(max_rate=10)
+    limiter.needs_retry('ec2', 'us-east-1', response=(Response(500), {'Error': {'Code': 'InternalError'}}))
+    limiter.needs_retry('ec2', 'us-east-1', response=None)
+    assert limiter.summary()[0]['throttles'] == 0
+    assert limiter.bucket('ec2', 'us-east-1').rate == 10
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+
+from aws_audit.cost import ServiceCost
+from aws_audit.report import (
+    REPORT_FIELDS,
+    CsvReportWriter,
+    NdjsonReportWriter,
+    ReportRow,
+    change_rows,
+    cost_rows
+)
+
+COSTS = {
+    'EC2': ServiceCost(('m5.large', 't3.nano'), (2, 1), (2, 1), (0.1, None), (146.0, 0.0)),
+    'ELB': ServiceCost((), (), (), (), ()),
+}
+
+
+def test_cost_rows_leave_unpriced_costs_empty():
+    rows = cost_rows('123456789012', 'us-east-1', COSTS)
+    assert [row.as_dict() for row in rows] == [
+        {
+            'account': '123456789012', 'region': 'us-east-1', 'report': 'pricing',
+            'service': 'EC2', 'type': 'm5.large', 'count': 2, 'quantity': 2,
+            'price': 0.1, 'cost': 146.0, 'detail': '',
+        },
+        {
+            'account': '123456789012', 'region': 'us-east-1', 'report': 'pricing',
+            'service': 'EC2', 'type': 't3.nano', 'count': 1, 'quantity': 1,
+            'price': None, 'cost': None, 'detail': '',
+        },
+    ]
+
+
+def test_change_rows():
+    rows = change_rows('123456789012', 'us-east-1', [('EC2', 'i-1', 'added', 'running m5.large')])
+    assert [(row.report, row.service, row.type, row.detail) for row in rows] == [
+        ('changes', 'EC2', 'i-1', 'added: running m5.large'),
+    ]
+
+
+def test_ndjson_writer():
+    stream = io.StringIO()
+    writer = NdjsonReportWriter(stream)
+    writer.write_region(cost_rows('123456789012', 'us-east-1', COSTS))
+    writer.write_region([ReportRow('123456789012', 'eu-west-1', 'resources', 'EC2', 'm5.large', 3)])
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [list(record) for record in records] == [list(REPORT_FIELDS)] * 3
+    assert [record['region'] for record in records] == ['us-east-1', 'us-east-1', 'eu-west-1']
+    assert records[1]['cost'] is None
+
+
+def test_csv_writer_header_and_empty_values():
+    stream = io.StringIO()
+    writer = CsvReportWriter(stream)
+    # The header is written before any region
+    assert stream.getvalue().splitlines() == [','.join(REPORT_FIELDS)]
+    writer.write_region(cost_rows('123456789012', 'us-east-1', COSTS))
+    rows = list(csv.reader(io.StringIO(stream.getvalue())))
+    assert rows[1:] == [
+        ['123456789012', 'us-east-1', 'pricing', 'EC2', 'm5.large', '2', '2', '0.1', '146.0', ''],
+        ['123456789012', 'us-east-1', 'pricing', 'EC2', 't3.nano', '1', '1', '', '', ''],
+    ]
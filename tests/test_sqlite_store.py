@@ -0,0 +1,94 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+import audit_suite
+import fixtures
+from aws_audit.inventory import InstanceRecord, VolumeRecord
+from aws_audit.price_index import PriceIndex
+from aws_audit.sqlite_store import InventoryDatabase
+
+LAUNCHED = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def sorted_lines(costs):
+    return {
+        section: sorted(cost.lines(), key=lambda line: str(line[0]))
+        for section, cost in costs.items()
+    }
+
+
+# The line_costs view re-implements CostEngine's cost math in SQL, both
+# must cost a stored inventory the same
+def test_region_costs_match_cost_engine(tmp_path):
+    random.seed(0)
+    clients = audit_suite.StubbedClients()
+    clients.queue('pricing', 'us-east-1', 'get_products', fixtures.price_list_pages(200))
+    audit = audit_suite.discovered_audit(
+        clients, 300, ['--cache-dir', str(tmp_path / 'cache'), '--refresh-pricing']
+    )
+    database = audit.database = InventoryDatabase(str(tmp_path / 'audits.db'))
+    audit.audit_id = database.start_audit(audit.per_month_hours)
+    audit.discover_resources(audit.aws_regions, 1)
+    engine = audit.price_engine(audit.aws_regions)
+    region = audit.aws_regions[0]
+
+    audit.database = None
+    expected = audit.region_costs(region, engine)
+    audit.database = database
+    audit.store_region(region)
+    actual = database.region_costs(audit.audit_id, region)
+    database.close()
+
+    assert set(actual) == set(expected)
+    expected_lines = sorted_lines(expected)
+    for section, lines in sorted_lines(actual).items():
+        assert len(lines) == len(expected_lines[section]), section
+        for line, expected_line in zip(lines, expected_lines[section]):
+            label, count, quantity, price, cost = line
+            assert (label, count, price) == expected_line[:2] + (expected_line[3],)
+            assert quantity == pytest.approx(expected_line[2])
+            assert cost == pytest.approx(expected_line[4])
+    assert sum(cost.total_cost for cost in actual.values()) > 0
+
+
+def test_stored_inventory_costs(tmp_path):
+    database = InventoryDatabase(str(tmp_path / 'audits.db'))
+    audit_id = database.start_audit(730)
+    resources = {
+        'EC2': {
+            'i-1': InstanceRecord('key', LAUNCHED, 'running', 'm5.large'),
+            'i-2': InstanceRecord('key', LAUNCHED, 'running', 'm5.large'),
+            'i-3': InstanceRecord('key', LAUNCHED, 'stopped', 'm5.large'),
+        },
+        'EBS': {
+            'vol-1': VolumeRecord('in-use', 10, 'gp2', True),
+            'vol-2': VolumeRecord('available', 30, 'gp2', False),
+        },
+        'ELB': {'classic': {'instanceId': [{'InstanceId': 'i-1'}]}},
+    }
+    snapshots = [('snap-1', 'vol-1'), ('snap-2', 'vol-1'), ('snap-3', 'vol-gone')]
+    database.add_region(audit_id, 'us-east-1', resources, snapshots, ['network'])
+    database.add_prices(audit_id, PriceIndex({
+        ('us-east-1', 'EC2', 'm5.large', 'OnDemand', None): 0.1,
+        ('us-east-1', 'EBS', 'gp2', 'OnDemand', None): 0.1,
+        ('us-east-1', 'ELB', None, 'OnDemand', None): 0.025,
+        ('us-east-1', 'Snapshots', None, 'OnDemand', None): 0.05,
+    }))
+    costs = database.region_costs(audit_id, 'us-east-1')
+    database.close()
+
+    lines = {section: cost.lines() for section, cost in costs.items()}
+    assert lines == {
+        'EC2': [('m5.large', 2, 2, 0.1, pytest.approx(2 * 0.1 * 730))],
+        'ELB': [('', 1, 1, 0.025, pytest.approx(0.025 * 730))],
+        # No price for network load balancers
+        'ELBV2': [('', 1, 1, None, 0.0)],
+        'Attached Volume': [('gp2', 1, 10, 0.1, pytest.approx(1.0))],
+        'Orphaned Volume': [('gp2', 1, 30, 0.1, pytest.approx(3.0))],
+        'Snapshots': [
+            ('snapshots', 1, 10, 0.05, pytest.approx(0.5)),
+            ('orphaned snapshots', 1, 1, 0.05, pytest.approx(0.05)),
+        ],
+    }
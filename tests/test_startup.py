@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+import startup
+
+# Wall-clock checks depend on the machine's load, they only run when
+# AWS_AUDIT_TIMING_TESTS is set
+timing = pytest.mark.skipif(
+    not os.environ.get('AWS_AUDIT_TIMING_TESTS'),
+    reason='set AWS_AUDIT_TIMING_TESTS=1 to check the startup budget'
+)
+
+
+def test_aws_and_report_modules_not_imported_eagerly():
+    assert startup.loaded_deferred_modules() == []
+
+
+@timing
+def test_import_within_budget():
+    elapsed = startup.time_command(startup.COMMANDS['import'], startup.DEFAULT_RUNS)
+    assert elapsed < startup.DEFAULT_BUDGET
+
+
+@timing
+def test_help_within_budget():
+    elapsed = startup.time_command(startup.COMMANDS['help'], startup.DEFAULT_RUNS)
+    assert elapsed < startup.DEFAULT_BUDGET